@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+
+# barcode_encoder.py
+#
+# Copyright 2022-2023 Pablo Sánchez Rodríguez
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Compare the throughput of encoding barcodes one by one with the throughput of
+encoding them in batches, for every supported symbology.
+
+The benchmark runs against an installed copy of Passes, since the encoder
+needs its native library:
+
+    build-aux/benchmarks/barcode_encoder.py /app/share/passes
+"""
+
+import argparse
+import builtins
+import sys
+import time
+
+
+def payloads(amount, length):
+    return ['%0*d' % (length, index) for index in range(amount)]
+
+
+def measure(function, repetitions):
+    best_time = None
+
+    for repetition in range(repetitions):
+        start = time.perf_counter()
+        function()
+        elapsed_time = time.perf_counter() - start
+
+        if best_time is None or elapsed_time < best_time:
+            best_time = elapsed_time
+
+    return best_time
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n\n')[0])
+    parser.add_argument('pkgdatadir',
+                        help='directory where the passes module is installed')
+    parser.add_argument('--barcodes', type=int, default=500,
+                        help='amount of barcodes of every symbology')
+    parser.add_argument('--length', type=int, default=64,
+                        help='length of the payload of every barcode')
+    parser.add_argument('--repetitions', type=int, default=5,
+                        help='the best time of this many runs is reported')
+    arguments = parser.parse_args()
+
+    sys.path.insert(1, arguments.pkgdatadir)
+    builtins._ = lambda message: message
+
+    from passes.barcode_content_encoder import BarcodeContentEncoder, BarcodeType
+
+    texts = payloads(arguments.barcodes, arguments.length)
+
+    print('%-10s %14s %14s %8s' % ('Symbology', 'Per call (/s)', 'Batch (/s)', 'Speedup'))
+
+    for barcode_type in BarcodeType:
+        barcodes = [(text, barcode_type, None) for text in texts]
+
+        def encode_one_by_one():
+            for text, barcode_type, encoding in barcodes:
+                BarcodeContentEncoder.encode_barcode(text, barcode_type, encoding)
+
+        def encode_batch():
+            BarcodeContentEncoder.encode_barcodes(barcodes)
+
+        per_call_time = measure(encode_one_by_one, arguments.repetitions)
+        batch_time = measure(encode_batch, arguments.repetitions)
+
+        print('%-10s %14.0f %14.0f %7.2fx' % (barcode_type.name,
+                                             len(barcodes) / per_call_time,
+                                             len(barcodes) / batch_time,
+                                             per_call_time / batch_time))
+
+
+if __name__ == '__main__':
+    main()
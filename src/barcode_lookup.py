@@ -0,0 +1,68 @@
+# barcode_lookup.py
+#
+# Copyright 2022-2023 Pablo Sánchez Rodríguez
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+
+from gi.repository import GLib
+
+from .dbus_object import DBusError, DBusObject
+
+
+BARCODE_LOOKUP_XML = '''
+<node>
+  <interface name="me.sanchezrodriguez.passes.BarcodeLookup">
+    <method name="FindPass">
+      <arg type="s" name="message" direction="in"/>
+      <arg type="s" name="format" direction="in"/>
+      <arg type="s" name="identifier" direction="out"/>
+      <arg type="s" name="description" direction="out"/>
+      <arg type="s" name="creator" direction="out"/>
+    </method>
+  </interface>
+</node>
+'''
+
+
+class BarcodeLookup(DBusObject):
+    """
+    Find the pass a scanned barcode belongs to.
+
+    The format may be empty, in which case passes are matched by the message
+    of their barcode only. Lookups are answered by the barcode index of the
+    catalog, so they take the same time whatever the size of the library.
+    """
+
+    INTERFACE_XML = BARCODE_LOOKUP_XML
+    OBJECT_PATH_SUFFIX = '/BarcodeLookup'
+
+    def __init__(self, application, catalog):
+        super().__init__(application)
+        self.__catalog = catalog
+
+    # D-Bus methods
+
+    def find_pass(self, message, format):
+        identifier = self.__catalog.find_barcode(message, format)
+        entry = self.__catalog.entry(identifier) if identifier else None
+
+        # The pass may have been deleted while the application was closed
+        if entry is None or not os.path.exists(entry.get('path') or ''):
+            raise DBusError('NotFound', 'No pass has this barcode')
+
+        return GLib.Variant('(sss)', (identifier,
+                                      entry.get('description') or '',
+                                      entry.get('creator') or ''))
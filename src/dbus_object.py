@@ -0,0 +1,91 @@
+# dbus_object.py
+#
+# Copyright 2022-2023 Pablo Sánchez Rodríguez
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from gi.repository import Gio
+
+
+class DBusObject:
+    """
+    An object the application exports on the session bus, next to its own.
+
+    Subclasses describe their interface with INTERFACE_XML and implement its
+    methods, which are named after them in snake case and return the
+    GLib.Variant to reply with, or None. Errors are replied with the
+    DBusError exception.
+    """
+
+    INTERFACE_XML = None
+    OBJECT_PATH_SUFFIX = None
+
+    def __init__(self, application):
+        self._application = application
+        self.__connection = None
+        self.__registration_id = None
+
+        node_info = Gio.DBusNodeInfo.new_for_xml(self.INTERFACE_XML)
+        self.__interface_info = node_info.interfaces[0]
+
+    def __on_method_call(self, connection, sender, object_path,
+                         interface_name, method_name, parameters, invocation):
+
+        method = getattr(self, self.__snake_case(method_name))
+
+        # The application must not quit while a call is being answered
+        self._application.hold()
+
+        try:
+            invocation.return_value(method(*parameters.unpack()))
+
+        except DBusError as error:
+            invocation.return_dbus_error(
+                '{}.{}'.format(interface_name, error.name), str(error))
+
+        except Exception as error:
+            invocation.return_dbus_error('{}.Error'.format(interface_name),
+                                         str(error))
+
+        finally:
+            self._application.release()
+
+    @staticmethod
+    def __snake_case(method_name):
+        return ''.join('_' + character.lower() if character.isupper()
+                       else character
+                       for character in method_name).lstrip('_')
+
+    def export(self, connection, object_path):
+        self.__connection = connection
+        self.__registration_id = connection.register_object(
+            object_path + self.OBJECT_PATH_SUFFIX,
+            self.__interface_info,
+            self.__on_method_call,
+            None,
+            None)
+
+    def unexport(self):
+        if self.__registration_id is None:
+            return
+
+        self.__connection.unregister_object(self.__registration_id)
+        self.__connection = None
+        self.__registration_id = None
+
+
+class DBusError(Exception):
+    def __init__(self, name, message):
+        self.name = name
+        super().__init__(message)
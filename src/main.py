@@ -15,6 +15,8 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import logging
+import os
 import sys
 import gi
 
@@ -24,11 +26,19 @@ gi.require_version('Adw', '1')
 
 from gi.repository import GLib, Gdk, Gio, Gtk, Adw
 
+from .barcode_lookup import BarcodeLookup
+from .barcode_matrix_cache import BarcodeMatrixCache
 from .digital_pass import DigitalPass
 from .digital_pass_factory import FileIsNotAPass, FormatNotSupportedYet, PassFactory
 from .digital_pass_list_store import DigitalPassListStore
 from .digital_pass_updater import PassUpdater
+from .pass_archive import PassArchive
+from .pass_bundle import PassBundle, PassBundleImporter
+from .pass_catalog import PassCatalog
+from .pass_file_monitor import PassFileMonitor
+from .pass_renderer import PassRenderer
 from .persistence import FileAlreadyImported, PersistenceManager
+from .search_provider import SearchProvider
 from .window import PassesWindow
 
 
@@ -38,27 +48,246 @@ class Application(Adw.Application):
                          flags=Gio.ApplicationFlags.FLAGS_NONE)
 
         self.__file_chooser = None
-        self.__pass_list = DigitalPassListStore()
+        self.__image_file_chooser = None
         self.__persistence = PersistenceManager()
 
+        # The catalog keeps the search terms of passes across sessions, so
+        # that unchanged passes are not indexed again
+        self.__catalog = PassCatalog(self.__persistence.catalog_icon_directory())
+        self.__catalog.load_entries(self.__persistence.load_catalog())
+        self.__saved_catalog_revision = self.__catalog.revision()
+
+        self.__pass_list = DigitalPassListStore(self.__catalog)
+        self.__passes_loaded = False
+        self.__pass_file_monitor = None
+
+        # Expired passes are moved into an archive, which is only loaded when
+        # the user asks for it
+        self.__archive = DigitalPassListStore(self.__catalog)
+        self.__archive_loaded = False
+
+        # GNOME Shell searches and barcode lookups go through the catalog, so
+        # the application can answer them without loading any pass. Keep it
+        # running for a while between the calls of a session.
+        self.__dbus_objects = [SearchProvider(self, self.__catalog),
+                               BarcodeLookup(self, self.__catalog)]
+        self.set_inactivity_timeout(10000)
+
+        self.add_main_option('export-images', 0, GLib.OptionFlags.NONE,
+                             GLib.OptionArg.FILENAME,
+                             _('Save an image of every pass into a directory'),
+                             _('DIRECTORY'))
+
+        # Barcodes encoded in previous sessions do not need to be encoded
+        # again. They are loaded the first time a barcode is displayed, which never
+        # happens when the application only answers searches
+        BarcodeMatrixCache.default()\
+            .set_loader(self.__persistence.load_barcode_matrices)
+        self.__saved_barcode_matrices_revision = \
+            BarcodeMatrixCache.default().revision()
+
+    def __load_passes(self):
+        if self.__passes_loaded:
+            return
+
+        self.__passes_loaded = True
+
         pass_files = self.__persistence.load_pass_files()
         for pass_file in pass_files:
-            digital_pass = PassFactory.create(pass_file)
+            try:
+                digital_pass = PassFactory.create(pass_file)
+            except Exception as exception:
+                # A broken or oversized pass must not prevent the application
+                # from starting
+                logging.warning('Unable to load %s: %s',
+                                pass_file.get_path(), exception)
+                continue
+
+            if digital_pass.has_expired() and self.__archive_pass(digital_pass):
+                continue
+
             self.__pass_list.insert(digital_pass)
 
+        # Forget the passes that were deleted while the application was
+        # closed. Archived passes have not been loaded, so the catalog is
+        # trusted for them.
+        self.__catalog.retain(self.__pass_list.identifiers() |
+                              self.__archived_identifiers())
+
+        # Passes added, replaced or deleted by other programs, e.g. sync
+        # tools, are applied to the pass list as they happen
+        self.__pass_file_monitor = PassFileMonitor(
+            self.__persistence.passes_directory(),
+            DigitalPass.supported_file_extensions(),
+            self.__on_pass_files_changed)
+
+    def __on_pass_files_changed(self, written_paths, deleted_paths):
+        window = self.window()
+        selected_pass = window.selected_pass() if window else None
+
+        for path in deleted_paths:
+            digital_pass = self.__pass_list.pass_with_path(path)
+
+            if digital_pass:
+                self.__pass_list.remove_pass(digital_pass)
+
+        for path in written_paths:
+            self.__reload_pass_file(path)
+
+        if not window or self.__showing_archive():
+            return
+
+        window.force_fold(self.__pass_list.is_empty())
+
+        if self.__pass_list.is_empty() or not selected_pass:
+            return
+
+        path = selected_pass.get_path()
+        if self.__pass_list.pass_with_path(path) is selected_pass:
+            return
+
+        # The selected pass is gone or has been replaced by a new version
+        found, index = self.__pass_list.find(selected_pass)
+        window.select_pass_at_index(index if found else 0)
+
+    def __reload_pass_file(self, path):
+        current_pass = self.__pass_list.pass_with_path(path)
+
+        # Files written by the application itself are already in the list
+        if current_pass and self.__catalog.is_current(current_pass):
+            return
+
+        try:
+            digital_pass = PassFactory.create(Gio.File.new_for_path(path))
+        except Exception as exception:
+            # The file may still be incomplete, or not be a pass at all
+            logging.warning('Unable to load %s: %s', path, exception)
+            return
+
+        if current_pass:
+            self.__pass_list.remove_pass(current_pass)
+
+        # Another file holds the same pass
+        if digital_pass in self.__pass_list:
+            return
+
+        if digital_pass.has_expired() and self.__archive_pass(digital_pass):
+            return
+
+        self.__pass_list.insert(digital_pass)
+
+    def __archive_pass(self, digital_pass):
+        try:
+            self.__persistence.archive_pass_file(digital_pass)
+        except OSError as error:
+            logging.warning('Unable to archive %s: %s',
+                            digital_pass.get_path(), error)
+            return False
+
+        # An archived copy of the pass has just been overwritten
+        if self.__archive_loaded:
+            archived_pass = self.__archive.pass_with_path(digital_pass.get_path())
+
+            if archived_pass:
+                self.__archive.remove_pass(archived_pass)
+
+        # Passes that expire while the application runs were removed from the
+        # catalog along with their previous version, and new passes that are
+        # already expired were never in it
+        identifier = digital_pass.unique_identifier()
+
+        if identifier in self.__catalog:
+            self.__catalog.relocate(identifier, digital_pass.get_path())
+        else:
+            self.__catalog.update(digital_pass)
+
+        if self.__archive_loaded:
+            self.__archive.insert(digital_pass)
+
+        return True
+
+    def __archived_identifiers(self):
+        # The archive may not be loaded, but the catalog knows its passes
+        return self.__catalog\
+            .identifiers_in(self.__persistence.archive_directory())
+
+    def __load_archive(self):
+        if self.__archive_loaded:
+            return
+
+        self.__archive_loaded = True
+
+        archived_passes = []
+        for pass_file in self.__persistence.load_pass_files(archived=True):
+            try:
+                archived_passes.append(PassFactory.create(pass_file))
+            except Exception as exception:
+                logging.warning('Unable to load %s: %s',
+                                pass_file.get_path(), exception)
+
+        self.__archive.insert_all(archived_passes)
+
+    def __migrate_pass_files(self):
+        # Pass files are named after the identifier of their pass
+        for path in self.__persistence.migrate_pass_files():
+            self.__catalog.relocate(os.path.basename(path), path)
+
+    def __presented_pass_list(self):
+        return self.__archive if self.__showing_archive() else self.__pass_list
+
+    def __show_archive(self, show):
+        action = self.lookup_action('show-archive')
+
+        if action:
+            action.change_state(GLib.Variant.new_boolean(show))
+
+    def __showing_archive(self):
+        action = self.lookup_action('show-archive')
+        return bool(action) and action.get_state().get_boolean()
+
+    def __prepare_pass_files(self):
+        # Updates interrupted in a previous session are finished or undone
+        # before any pass file is read
+        try:
+            self.__persistence.recover()
+        except OSError as error:
+            logging.warning('Unable to recover pass files: %s', error)
+
+        self.__migrate_pass_files()
+
+    def __save_catalog(self):
+        if self.__catalog.revision() == self.__saved_catalog_revision:
+            return
+
+        try:
+            self.__persistence.save_catalog(self.__catalog.entries())
+        except OSError as error:
+            logging.warning('Unable to save the pass catalog: %s', error)
+            return
+
+        self.__saved_catalog_revision = self.__catalog.revision()
+
     def do_activate(self):
         window = self.props.active_window
 
         if not window:
+            self.__load_passes()
             window = PassesWindow(application=self,
                                   pass_list_model=self.__pass_list)
 
         self.create_action('about', self.on_about_action)
         self.create_action('delete', self.on_delete_action)
+        self.create_action('export', self.on_export_action)
         self.create_action('import', self.on_import_action, ['<Control>o'])
         self.create_action('quit', self.on_quit_action, ['<Control>q'])
         self.create_action('update', self.on_update_action, ['<Control>u'])
 
+        if not self.lookup_action('show-archive'):
+            show_archive_action = Gio.SimpleAction\
+                .new_stateful('show-archive', None, GLib.Variant.new_boolean(False))
+            show_archive_action.connect('change-state', self.on_show_archive_action)
+            self.add_action(show_archive_action)
+
         pass_list_is_empty = self.__pass_list.is_empty()
         window.force_fold(pass_list_is_empty)
 
@@ -67,24 +296,104 @@ class Application(Adw.Application):
 
         window.present()
 
+    def do_dbus_register(self, connection, object_path):
+        Adw.Application.do_dbus_register(self, connection, object_path)
+
+        for dbus_object in self.__dbus_objects:
+            dbus_object.export(connection, object_path)
+
+        return True
+
+    def do_dbus_unregister(self, connection, object_path):
+        for dbus_object in self.__dbus_objects:
+            dbus_object.unexport()
+
+        Adw.Application.do_dbus_unregister(self, connection, object_path)
+
+    def do_handle_local_options(self, options):
+        if not options.contains('export-images'):
+            return -1
+
+        directory = options.lookup_value('export-images').get_bytestring()
+        directory = os.fsdecode(directory)
+        os.makedirs(directory, exist_ok=True)
+
+        # This runs instead of the startup of the application, so pass files
+        # have to be recovered and migrated here
+        self.__prepare_pass_files()
+        self.__save_catalog()
+
+        pass_files = self.__persistence.load_pass_files() + \
+                     self.__persistence.load_pass_files(archived=True)
+        pass_paths = [pass_file.get_path() for pass_file in pass_files]
+
+        results = PassRenderer.render_files(pass_paths, directory)
+        failures = [result for result in results
+                    if isinstance(result, Exception)]
+
+        for failure in failures:
+            logging.warning('Unable to render %s', failure)
+
+        if not results:
+            logging.warning('There are no passes to render')
+
+        return 1 if failures or not results else 0
+
+    def do_shutdown(self):
+        if self.__pass_file_monitor:
+            self.__pass_file_monitor.cancel()
+
+        barcode_matrix_cache = BarcodeMatrixCache.default()
+
+        if barcode_matrix_cache.revision() != self.__saved_barcode_matrices_revision:
+            try:
+                self.__persistence\
+                    .save_barcode_matrices(barcode_matrix_cache.entries())
+            except OSError as error:
+                logging.warning('Unable to save barcode matrices: %s', error)
+
+        self.__save_catalog()
+
+        Adw.Application.do_shutdown(self)
+
     def do_startup(self):
         Adw.Application.do_startup(self)
+        self.__prepare_pass_files()
 
     def import_pass(self, pass_file):
         try:
-            digital_pass = PassFactory.create(pass_file)
+            pass_data = None
+
+            if pass_file.get_path():
+                digital_pass = PassFactory.create(pass_file)
+            else:
+                # Files that are not in the local filesystem are loaded in
+                # memory once, and both parsed and stored from there
+                pass_data = PassArchive.load_contents(pass_file)
+                digital_pass = PassFactory.create(pass_data)
+
+            if isinstance(digital_pass, PassBundle):
+                self.import_pass_bundle(digital_pass)
+                return
 
-            if digital_pass in self.__pass_list:
+            if digital_pass in self.__pass_list or \
+               digital_pass.unique_identifier() in self.__archived_identifiers():
                 self.window().show_toast("Pass already imported")
                 return
 
-            stored_file = self.__persistence\
-                .save_pass_file(pass_file, digital_pass.unique_identifier())
+            if pass_data is None:
+                stored_file = self.__persistence\
+                    .save_pass_file(pass_file, digital_pass.unique_identifier())
+            else:
+                stored_file = self.__persistence\
+                    .save_pass_data(pass_data, digital_pass.unique_identifier())
 
             digital_pass.set_path(stored_file.get_path())
             self.__pass_list.insert(digital_pass)
 
             if self.window():
+                self.__show_archive(False)
+
                 if not self.__pass_list.is_empty():
                     self.window().force_fold(False)
 
@@ -95,6 +404,55 @@ class Application(Adw.Application):
         except Exception as exception:
             self.window().show_toast(str(exception))
 
+    def import_pass_bundle(self, bundle):
+        importer = PassBundleImporter(self.__pass_list, self.__persistence,
+                                      self.__archived_identifiers())
+        imported_passes = importer.import_bundle(bundle)
+
+        skipped_passes = bundle.skipped_passes()
+        if skipped_passes and self.window():
+            message = ngettext('{} pass could not be read',
+                               '{} passes could not be read',
+                               skipped_passes).format(skipped_passes)
+            self.window().show_toast(message)
+
+        if not imported_passes:
+            self.window().show_toast(_('Passes already imported'))
+            return
+
+        if self.window():
+            self.__show_archive(False)
+            self.window().force_fold(False)
+
+            found, index = self.__pass_list.find(imported_passes[0])
+            if found:
+                self.window().select_pass_at_index(index)
+
+            message = _('{} passes imported').format(len(imported_passes))
+            self.window().show_toast(message)
+
+    def present_pass(self, identifier):
+        """
+        Show the window with a pass selected
+        """
+        self.activate()
+
+        self.__show_archive(identifier in self.__archived_identifiers())
+
+        # The pass may be hidden by a search
+        self.window().search('')
+
+        found, index = self.__presented_pass_list().find_identifier(identifier)
+        if found:
+            self.window().select_pass_at_index(index)
+
+    def present_search(self, query):
+        """
+        Show the window with the passes that match a query
+        """
+        self.activate()
+        self.window().search(query)
+
     def on_about_action(self, widget, __):
         about = Adw.AboutWindow()
         about.set_application_icon('me.sanchezrodriguez.passes')
@@ -112,20 +470,49 @@ class Application(Adw.Application):
         if not self.window():
             return
 
+        pass_list = self.__presented_pass_list()
         selected_pass = self.window().selected_pass()
         selected_pass_index = self.window().selected_pass_index()
 
         self.__persistence.delete_pass_file(selected_pass)
-        self.__pass_list.remove(selected_pass_index)
+        pass_list.remove(selected_pass_index)
 
-        if self.__pass_list.is_empty():
+        if pass_list.is_empty():
             self.window().force_fold(True)
             self.window().navigate_back()
             return
 
-        index_to_select = min(self.__pass_list.length() - 1, selected_pass_index)
+        index_to_select = min(pass_list.length() - 1, selected_pass_index)
         self.window().select_pass_at_index(index_to_select)
 
+    def on_export_action(self, widget, __):
+        selected_pass = self.window().selected_pass()
+
+        if not selected_pass:
+            return
+
+        if not self.__image_file_chooser:
+            self.__image_file_chooser = Gtk.FileDialog.new()
+
+            filter_list = Gio.ListStore.new(Gtk.FileFilter)
+            for name, mime_type in [(_('PNG image'), 'image/png'),
+                                    (_('SVG image'), 'image/svg+xml')]:
+                image_filter = Gtk.FileFilter()
+                image_filter.set_name(name)
+                image_filter.add_mime_type(mime_type)
+                filter_list.append(image_filter)
+
+            self.__image_file_chooser.set_filters(filter_list)
+            self.__image_file_chooser.set_modal(True)
+
+        file_name = selected_pass.description().replace(os.sep, '-') + '.png'
+        self.__image_file_chooser.set_initial_name(file_name)
+
+        self.__image_file_chooser.save(
+            parent = self.window(),
+            callback = lambda file_chooser, result:
+                self._on_image_file_chosen(file_chooser, result, selected_pass))
+
     def on_import_action(self, widget, __):
         if not self.__file_chooser:
             self.__file_chooser = Gtk.FileDialog.new()
@@ -155,6 +542,18 @@ class Application(Adw.Application):
     def on_quit_action(self, widget, _):
         self.window().close()
 
+    def on_show_archive_action(self, action, state):
+        if state == action.get_state():
+            return
+
+        action.set_state(state)
+
+        if state.get_boolean():
+            self.__load_archive()
+            self.window().present_passes(self.__archive, archived=True)
+        else:
+            self.window().present_passes(self.__pass_list)
+
     def on_update_action(self, widget, __):
         """ Update currently selected pass """
         selected_pass = self.window().selected_pass()
@@ -162,27 +561,31 @@ class Application(Adw.Application):
         if not selected_pass:
             return
 
+        # The selected pass may be an archived one
+        pass_list = self.__presented_pass_list()
+
         try:
-            # Download and save the latest version of the pass file
+            # Download the latest version of the pass and create a new pass
+            # straight from the downloaded data
             latest_pass_data = PassUpdater.update(selected_pass)
-            stored_file = self.__persistence\
-                .save_pass_data(latest_pass_data,
-                                selected_pass.unique_identifier() + '.tmp')
-
-            # Create a new pass from the saved file
-            digital_pass = PassFactory.create(stored_file)
+            digital_pass = PassFactory.create(latest_pass_data)
 
-            # Replace the old pass with the new one
-            self.__pass_list.insert(digital_pass)
-            selected_pass_index = self.window().selected_pass_index()
-            self.__pass_list.remove(selected_pass_index)
+            # Save the latest version of the pass file next to the current one
+            stored_file = self.__persistence\
+                .stage_pass_data(latest_pass_data, selected_pass)
+            digital_pass.set_path(stored_file.get_path())
 
             # Replace the old pass file with the new one
             self.__persistence.replace_pass_file(selected_pass,
                                                  replacement=digital_pass)
 
+            # Replace the old pass with the new one. Both share the same
+            # identifier, so the old one has to be removed first.
+            pass_list.remove_pass(selected_pass)
+            pass_list.insert(digital_pass)
+
             # Select the new pass in the pass list
-            found, updated_pass_index = self.__pass_list.find(digital_pass)
+            found, updated_pass_index = pass_list.find(digital_pass)
             self.window().select_pass_at_index(updated_pass_index)
 
             # Notify user
@@ -214,6 +617,20 @@ class Application(Adw.Application):
             self.window().show_toast(exception.message)
 
 
+    def _on_image_file_chosen(self, file_chooser, result, a_pass):
+        try:
+            image_file = file_chooser.save_finish(result)
+
+            if not image_file:
+                return
+
+            PassRenderer().render(a_pass, image_file.get_path())
+
+            self.window().show_toast(_('Pass saved as an image'))
+
+        except Exception as exception:
+            self.window().show_toast(str(exception))
+
     def window(self):
         return self.props.active_window
 
@@ -3,8 +3,10 @@
 #include <stdlib.h>
 
 const char FOREGROUND = '1';
-const char BACKGROUND = '2';
-char * last_result = NULL;
+
+// Values of the modules written by encode_barcode_matrix()
+const unsigned char FOREGROUND_MODULE = 1;
+const unsigned char BACKGROUND_MODULE = 0;
 
 enum BarcodeType
 {
@@ -14,31 +16,72 @@ enum BarcodeType
     QRCODE
 };
 
-char * encode_2d_symbol(struct zint_symbol* symbol, unsigned char * data);
-char * encode_barcode(unsigned char * data, unsigned symbology, unsigned * out_width, unsigned * out_height);
+enum EncodingStatus
+{
+    ENCODING_OK = 0,
+    ENCODING_ERROR,
+    BUFFER_TOO_SMALL
+};
 
-char * encode_2d_symbol(struct zint_symbol* symbol, unsigned char * data)
+void configure_symbol(struct zint_symbol* symbol, unsigned symbology);
+void copy_modules(struct zint_symbol* symbol, unsigned char * buffer);
+int encode_barcode_batch(unsigned count,
+                         const unsigned char ** data,
+                         const unsigned * lengths,
+                         const unsigned * symbologies,
+                         unsigned char * buffer,
+                         unsigned buffer_size,
+                         unsigned * out_required_size,
+                         unsigned * out_offsets,
+                         unsigned * out_widths,
+                         unsigned * out_heights,
+                         int * out_statuses);
+int encode_barcode_matrix(const unsigned char * data,
+                          unsigned length,
+                          unsigned symbology,
+                          unsigned char * buffer,
+                          unsigned buffer_size,
+                          unsigned * out_width,
+                          unsigned * out_height);
+
+void configure_symbol(struct zint_symbol* symbol, unsigned symbology)
 {
-    symbol->input_mode = DATA_MODE; // DATA_MODE | UNICODE_MODE
-    symbol->output_options |= OUT_BUFFER_INTERMEDIATE;
+    switch (symbology)
+    {
+        case AZTEC:
+            symbol->symbology = BARCODE_AZTEC;
+            break;
 
-    ZBarcode_Encode_and_Buffer(symbol, data, 0, 0);
+        case CODE128:
+            symbol->symbology = BARCODE_CODE128;
+            break;
 
-    unsigned amount_of_modules = (symbol->height * symbol->width) + 1;
-    unsigned module_size = symbol->bitmap_width / symbol->width;
+        case PDF417:
+            symbol->symbology = BARCODE_PDF417;
+            break;
+
+        case QRCODE:
+            symbol->symbology = BARCODE_QRCODE;
+            symbol->option_1 = 1; // Error Correction Level L=1 M=2 Q=3 H=4
+            break;
+    }
 
-    char* modules = malloc(amount_of_modules * sizeof(char));
+    symbol->input_mode = DATA_MODE; // DATA_MODE | UNICODE_MODE
+    symbol->output_options |= OUT_BUFFER_INTERMEDIATE;
+}
 
+void copy_modules(struct zint_symbol* symbol, unsigned char * buffer)
+{
+    unsigned module_size = symbol->bitmap_width / symbol->width;
     unsigned bitmap_index = 0;
     unsigned modules_index = 0;
+
     for (int row = 0; row < symbol->height; row++)
     {
         for (int column = 0; column < symbol->width; column++)
         {
-            char module = symbol->bitmap[bitmap_index] == FOREGROUND?
-                FOREGROUND : BACKGROUND;
-
-            modules[modules_index] = module;
+            buffer[modules_index] = symbol->bitmap[bitmap_index] == FOREGROUND?
+                FOREGROUND_MODULE : BACKGROUND_MODULE;
 
             bitmap_index += module_size;
             modules_index++;
@@ -46,57 +89,141 @@ char * encode_2d_symbol(struct zint_symbol* symbol, unsigned char * data)
 
         bitmap_index += symbol->width * module_size;
     }
-
-    modules[amount_of_modules - 1] = '\0';
-
-    return modules;
 }
 
-char * encode_barcode(unsigned char * data,
-                      unsigned symbology,
-                      unsigned * out_width,
-                      unsigned * out_height)
+/*
+ * Encode a barcode into a caller-provided buffer, using one byte per module
+ * (FOREGROUND_MODULE or BACKGROUND_MODULE), row by row.
+ *
+ * The function does not use any global state, so it can be called from
+ * several threads at the same time. If the buffer is too small, the size of
+ * the barcode is written to out_width and out_height, and BUFFER_TOO_SMALL is
+ * returned so that the caller can try again with a bigger buffer.
+ */
+int encode_barcode_matrix(const unsigned char * data,
+                          unsigned length,
+                          unsigned symbology,
+                          unsigned char * buffer,
+                          unsigned buffer_size,
+                          unsigned * out_width,
+                          unsigned * out_height)
 {
     struct zint_symbol* symbol;
+    int status = ENCODING_OK;
+
+    *out_width = 0;
+    *out_height = 0;
 
     symbol = ZBarcode_Create();
 
-    switch (symbology)
+    if (symbol == NULL)
     {
-        case AZTEC:
-            symbol->symbology = BARCODE_AZTEC;
-            break;
-
-        case CODE128:
-            symbol->symbology = BARCODE_CODE128;
-            break;
+        return ENCODING_ERROR;
+    }
 
-        case PDF417:
-            symbol->symbology = BARCODE_PDF417;
-            break;
+    configure_symbol(symbol, symbology);
 
-        case QRCODE:
-            symbol->symbology = BARCODE_QRCODE;
-            symbol->option_1 = 1; // Error Correction Level L=1 M=2 Q=3 H=4
-            break;
+    if (ZBarcode_Encode_and_Buffer(symbol, data, length, 0) >= ZINT_ERROR)
+    {
+        ZBarcode_Delete(symbol);
+        return ENCODING_ERROR;
     }
 
-    last_result = encode_2d_symbol(symbol, data);
     *out_width = symbol->width;
     *out_height = symbol->height;
 
+    unsigned amount_of_modules = symbol->height * symbol->width;
+
+    if (amount_of_modules > buffer_size)
+    {
+        status = BUFFER_TOO_SMALL;
+    }
+    else
+    {
+        copy_modules(symbol, buffer);
+    }
+
     ZBarcode_Delete(symbol);
 
-    return last_result;
+    return status;
 }
 
-void free_last_result()
+/*
+ * Encode several barcodes into a single caller-provided buffer, one after
+ * another. The matrix of the i-th barcode starts at out_offsets[i], and its
+ * status is written to out_statuses[i].
+ *
+ * A single zint symbol is reused for the whole batch. It is reset and
+ * configured again before every barcode, since zint writes the options it
+ * chose for a barcode (e.g. the version or the error correction level) back
+ * into the symbol, and they would constrain the barcodes that follow.
+ *
+ * The total size needed by the batch is written to out_required_size. If it
+ * does not fit in the buffer, BUFFER_TOO_SMALL is returned and the barcodes
+ * that did not fit are marked as BUFFER_TOO_SMALL too.
+ */
+int encode_barcode_batch(unsigned count,
+                         const unsigned char ** data,
+                         const unsigned * lengths,
+                         const unsigned * symbologies,
+                         unsigned char * buffer,
+                         unsigned buffer_size,
+                         unsigned * out_required_size,
+                         unsigned * out_offsets,
+                         unsigned * out_widths,
+                         unsigned * out_heights,
+                         int * out_statuses)
 {
-    if (last_result == NULL)
+    struct zint_symbol* symbol;
+    int status = ENCODING_OK;
+    unsigned offset = 0;
+
+    *out_required_size = 0;
+
+    symbol = ZBarcode_Create();
+
+    if (symbol == NULL)
     {
-        return;
+        return ENCODING_ERROR;
     }
 
-    free(last_result);
-    last_result = NULL;
+    for (unsigned i = 0; i < count; i++)
+    {
+        ZBarcode_Reset(symbol);
+        configure_symbol(symbol, symbologies[i]);
+
+        out_offsets[i] = offset;
+        out_widths[i] = 0;
+        out_heights[i] = 0;
+
+        if (ZBarcode_Encode_and_Buffer(symbol, data[i], lengths[i], 0) >= ZINT_ERROR)
+        {
+            out_statuses[i] = ENCODING_ERROR;
+            continue;
+        }
+
+        unsigned amount_of_modules = symbol->height * symbol->width;
+
+        out_widths[i] = symbol->width;
+        out_heights[i] = symbol->height;
+
+        if (offset + amount_of_modules > buffer_size)
+        {
+            out_statuses[i] = BUFFER_TOO_SMALL;
+            status = BUFFER_TOO_SMALL;
+        }
+        else
+        {
+            copy_modules(symbol, buffer + offset);
+            out_statuses[i] = ENCODING_OK;
+        }
+
+        offset += amount_of_modules;
+    }
+
+    *out_required_size = offset;
+
+    ZBarcode_Delete(symbol);
+
+    return status;
 }
@@ -0,0 +1,148 @@
+# barcode_matrix_cache.py
+#
+# Copyright 2022-2023 Pablo Sánchez Rodríguez
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import base64
+
+from .lru_cache import LRUCache
+
+
+class BarcodeMatrixCache:
+    """
+    A least recently used cache of encoded barcodes.
+
+    Every entry maps a (format, message, encoding) key to the module matrix
+    produced by the BarcodeContentEncoder, so that a barcode is only encoded
+    once no matter how many times it is displayed.
+
+    Entries saved in a previous session are only loaded, through the loader
+    of the cache, the first time the cache is used.
+    """
+
+    DEFAULT_CAPACITY = 256
+
+    __default = None
+
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        self.__entries = LRUCache(capacity)
+        self.__loader = None
+        self.__revision = 0
+
+    def __contains__(self, key):
+        self.__load()
+        return key in self.__entries
+
+    def __len__(self):
+        self.__load()
+        return len(self.__entries)
+
+    def __load(self):
+        if self.__loader is None:
+            return
+
+        loader = self.__loader
+        self.__loader = None
+        self.load_entries(loader())
+
+    def get(self, format, message, encoding):
+        """
+        Return the (modules, width, height) tuple of a barcode, or None if the
+        barcode is not in the cache
+        """
+        self.__load()
+        return self.__entries.get((format, message, encoding))
+
+    def put(self, format, message, encoding, matrix):
+        self.__load()
+        self.__entries.put((format, message, encoding), matrix)
+        self.__revision += 1
+
+    def get_or_encode(self, format, message, encoding, encoding_function):
+        """
+        Return the matrix of a barcode, encoding it with the provided function
+        only if it is not in the cache
+        """
+        matrix = self.get(format, message, encoding)
+
+        if matrix is None:
+            matrix = encoding_function(message, encoding)
+            self.put(format, message, encoding, matrix)
+
+        return matrix
+
+    def revision(self):
+        """
+        Return a number that changes every time a barcode is added to the
+        cache, but not when saved entries are loaded
+        """
+        return self.__revision
+
+    def set_loader(self, loader):
+        """
+        Set the function that returns the entries saved in a previous session
+        """
+        self.__loader = loader
+
+    def entries(self):
+        """
+        Return the content of the cache as a list of serializable entries,
+        from the least to the most recently used
+        """
+        self.__load()
+        return [[format, message, encoding,
+                 base64.b64encode(modules).decode('ascii'), width, height]
+                for (format, message, encoding), (modules, width, height)
+                in self.__entries.items()]
+
+    def load_entries(self, entries):
+        if not isinstance(entries, list):
+            return
+
+        for entry in entries:
+            if not isinstance(entry, list) or len(entry) != 6:
+                continue
+
+            format, message, encoding, modules, width, height = entry
+
+            if not all(isinstance(value, str)
+                       for value in (format, message, modules)) or \
+               not isinstance(encoding, (str, type(None))) or \
+               not all(isinstance(value, int) and value >= 0
+                       for value in (width, height)):
+                continue
+
+            try:
+                modules = base64.b64decode(modules, validate=True)
+            except ValueError:
+                continue
+
+            # Discard entries that do not match the size of their barcode
+            if len(modules) != width * height:
+                continue
+
+            modules = memoryview(modules).toreadonly()
+            self.__entries.put((format, message, encoding),
+                               (modules, width, height))
+
+    @classmethod
+    def default(cls):
+        """
+        Return the cache shared by all the barcode widgets
+        """
+        if cls.__default is None:
+            cls.__default = BarcodeMatrixCache()
+
+        return cls.__default
@@ -16,18 +16,25 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import locale
+import os
 import re
 
 from gi.repository import Gdk, GdkPixbuf, GLib, GObject
 
+from .pass_format import PassFormatRegistry
+
 
 class DigitalPass(GObject.GObject):
 
     __gtype_name__ = 'DigitalPass'
 
+    # Sort key of the dates of passes that have none, so that they go last
+    NO_DATE = GLib.MAXINT64
+
     def __init__(self):
         super().__init__()
         self.__path = None
+        self.__sort_keys = dict()
 
     def additional_information(self):
         raise NotImplementedError()
@@ -47,6 +54,12 @@ class DigitalPass(GObject.GObject):
     def expiration_date(self):
         raise NotImplementedError()
 
+    def fields(self):
+        """
+        Return all the fields of the pass, both on its front and its back
+        """
+        raise NotImplementedError()
+
     def file_extension(self):
         raise NotImplementedError()
 
@@ -56,6 +69,13 @@ class DigitalPass(GObject.GObject):
     def get_path(self):
         return self.__path
 
+    def grouping_identifier(self):
+        """
+        Return an identifier shared by the passes that belong together, e.g.
+        the boarding passes of a trip, or None if the pass is not grouped
+        """
+        raise NotImplementedError()
+
     def has_expired(self):
         expiration_date = self.expiration_date()
         return (expiration_date and Date.now() > expiration_date) \
@@ -70,8 +90,32 @@ class DigitalPass(GObject.GObject):
     def mime_type():
         raise NotImplementedError()
 
+    def relevant_date(self):
+        """
+        Return the date the pass is relevant at, e.g. the departure of a
+        flight, or None if it has none
+        """
+        raise NotImplementedError()
+
+    def searchable_texts(self):
+        """
+        Return the texts a pass can be found by
+        """
+        texts = [self.description(), self.creator()]
+
+        for field in self.fields():
+            texts.append(field.label())
+            texts.append(field.value())
+
+        for barcode in self.barcodes():
+            if isinstance(barcode, Barcode):
+                texts.append(barcode.alternative_text())
+
+        return [str(text) for text in texts if text]
+
     def set_path(self, new_path: str):
         self.__path = new_path
+        self.__sort_keys.pop('import-time', None)
 
     def unique_identifier(self):
         raise NotImplementedError()
@@ -79,13 +123,61 @@ class DigitalPass(GObject.GObject):
     def voided(self):
         raise NotImplementedError()
 
+    # Sort keys
+    #
+    # Passes are sorted by Gtk.Sorters that read these properties once per
+    # pass, so dates are not parsed and no Python code runs per comparison.
+
+    def __sort_key(self, name, compute_key):
+        key = self.__sort_keys.get(name)
+
+        if key is None:
+            key = compute_key()
+            self.__sort_keys[name] = key
+
+        return key
+
+    @staticmethod
+    def __date_sort_key(date):
+        return date.timestamp() if date else DigitalPass.NO_DATE
+
+    def __import_time(self):
+        try:
+            return os.stat(self.get_path()).st_mtime_ns
+        except (OSError, TypeError):
+            return 0
+
+    @GObject.Property(type=str)
+    def sort_creator(self):
+        return self.__sort_key('creator', lambda: self.creator() or '')
+
+    @GObject.Property(type=str)
+    def sort_description(self):
+        return self.__sort_key('description', lambda: self.description() or '')
+
+    @GObject.Property(type=GObject.TYPE_INT64)
+    def sort_expiration_date(self):
+        return self.__sort_key('expiration-date',
+            lambda: self.__date_sort_key(self.expiration_date()))
+
+    @GObject.Property(type=GObject.TYPE_INT64)
+    def sort_import_time(self):
+        # Pass files are written when they are imported, and only replaced
+        # when they are updated
+        return self.__sort_key('import-time', self.__import_time)
+
+    @GObject.Property(type=GObject.TYPE_INT64)
+    def sort_relevant_date(self):
+        return self.__sort_key('relevant-date',
+            lambda: self.__date_sort_key(self.relevant_date()))
+
     @classmethod
     def supported_mime_types(cls):
-        return [pass_type.mime_type() for pass_type in cls.__subclasses__()]
+        return PassFormatRegistry.mime_types()
 
     @classmethod
     def supported_file_extensions(cls):
-        return [pass_type.file_extension() for pass_type in cls.__subclasses__()]
+        return PassFormatRegistry.file_extensions(include_bundles=False)
 
 
 class Barcode:
@@ -270,6 +362,9 @@ class Date:
     def compare(self, other):
         return self.__date.compare(other.__date)
 
+    def timestamp(self):
+        return self.__date.to_unix()
+
     @classmethod
     def compare_dates(cls, date1, date2):
         if not date1 and not date2:
@@ -297,16 +392,42 @@ class Date:
 class Image:
 
     def __init__(self, image_data):
+        # Image data may be GLib.Bytes, which are never copied, or a memoryview
+        # that shares memory with the buffer the image was read from, which is
+        # only copied when the image is decoded.
         self.__data = image_data
 
+    def __as_bytes(self):
+        if isinstance(self.__data, bytes):
+            return self.__data
+
+        return bytes(self.__data)
+
+    def __as_glib_bytes(self):
+        if isinstance(self.__data, GLib.Bytes):
+            return self.__data
+
+        return GLib.Bytes(self.__as_bytes())
+
     def as_pixbuf(self):
         loader = GdkPixbuf.PixbufLoader()
-        loader.write(self.__data)
+        loader.write_bytes(self.__as_glib_bytes())
         loader.close()
         return loader.get_pixbuf()
 
     def as_texture(self):
-        return Gdk.Texture.new_from_bytes(GLib.Bytes(self.__data))
+        return Gdk.Texture.new_from_bytes(self.__as_glib_bytes())
+
+    def save(self, path):
+        """
+        Write the image, as it was stored in its pass, into a file
+        """
+        data = self.__data.get_data() \
+            if isinstance(self.__data, GLib.Bytes) \
+            else self.__data
+
+        with open(path, 'wb') as image_file:
+            image_file.write(data)
 
 
 class PassDataExtractor:
@@ -408,8 +529,8 @@ class TimeInterval:
 
     @classmethod
     def from_iso_strings(cls, start_time, end_time):
-        start_time = Date.from_iso_string(start_time) if start_time else Date.MIN
-        end_time = Date.from_iso_string(end_time) if end_time else Date.MAX
+        start_time = Date.from_iso_string(start_time) if start_time else Date(Date.MIN)
+        end_time = Date.from_iso_string(end_time) if end_time else Date(Date.MAX)
         return TimeInterval(start_time, end_time)
 
     def end_time(self):
@@ -15,67 +15,239 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-import re
+from gi.repository import Gio, GObject, Gtk
 
-from gi.repository import Gio, GObject
-
-from .digital_pass import Date, DigitalPass
+from .digital_pass import DigitalPass
+from .pass_catalog import PassCatalog
 
 
 class DigitalPassListStore(GObject.GObject):
+    """
+    The passes of the user.
+
+    Passes are stored in the order they were inserted, and presented through
+    a Gtk.FilterListModel that hides the ones that do not match the current
+    search and a Gtk.SortListModel that sorts the rest. Positions taken or
+    returned by this class refer to the passes that are presented.
+    """
 
     __gtype_name__ = 'DigitalPassListStore'
 
-    def __init__(self):
+    def __init__(self, catalog=None):
         super().__init__()
         self.__list_store = Gio.ListStore.new(DigitalPass)
+        self.__passes_by_identifier = dict()
+        self.__passes_by_path = dict()
+        self.__catalog = catalog if catalog is not None else PassCatalog()
+
+        self.__search_query = ''
+        self.__search_results = None
+        self.__search_filter = Gtk.CustomFilter.new(self.__matches_search)
+        self.__matching_passes = Gtk.FilterListModel.new(self.__list_store,
+                                                         self.__search_filter)
+
+        self.__sort_order = SortPassesBy.EXPIRATION_DATE
+        self.__presented_passes = Gtk.SortListModel.new(
+            self.__matching_passes, SortPassesBy.sorter(self.__sort_order))
 
     def __contains__(self, digital_pass):
-        return self.find(digital_pass)[0]
+        return digital_pass.unique_identifier() in self.__passes_by_identifier
+
+    def __index(self, digital_pass):
+        self.__passes_by_identifier[digital_pass.unique_identifier()] = digital_pass
+
+        if digital_pass.get_path():
+            self.__passes_by_path[digital_pass.get_path()] = digital_pass
+
+        # Make sure the catalog, which answers searches and barcode lookups,
+        # is up to date
+        self.__catalog.search_terms(digital_pass)
+
+    def __matches_search(self, digital_pass):
+        return self.__search_results is None or \
+               digital_pass.unique_identifier() in self.__search_results
+
+    def __refresh_search_results(self):
+        # The results have to be ready before the model changes, since the
+        # filter is evaluated as soon as new passes are added
+        if self.__search_query:
+            self.__search_results = self.__catalog.search(self.__search_query)
+
+    def catalog(self):
+        return self.__catalog
 
     def find(self, digital_pass):
+        return self.find_identifier(digital_pass.unique_identifier())
+
+    def find_identifier(self, identifier):
         # The implementation of this method should use
         # Gio.ListStore.find_with_equal_func() instead of get_item(). However,
         # the method is broken and the fix has not been merged yet.
         # https://gitlab.gnome.org/GNOME/pygobject/-/merge_requests/218
 
         for position in range(self.length()):
-            item = self.__list_store.get_item(position)
-            if item.unique_identifier() == digital_pass.unique_identifier():
+            item = self.__presented_passes.get_item(position)
+            if item.unique_identifier() == identifier:
                 return True, position
 
         return False, 0
 
     def get_model(self):
-        return self.__list_store
+        return self.__presented_passes
+
+    def identifiers(self):
+        return frozenset(self.__passes_by_identifier)
 
     def insert(self, digital_pass):
-        self.__list_store.insert_sorted(digital_pass,
-                                        SortPassesBy.expiration_date)
+        self.__index(digital_pass)
+        self.__refresh_search_results()
+
+        self.__list_store.append(digital_pass)
+
+    def insert_all(self, passes):
+        """
+        Insert several passes with a single update of the model
+        """
+        if not passes:
+            return
+
+        for digital_pass in passes:
+            self.__index(digital_pass)
+
+        self.__refresh_search_results()
+
+        self.__list_store.splice(len(self.__list_store), 0, passes)
 
     def is_empty(self):
-        return self.length() == 0
+        """
+        Return whether there are no passes at all, whether they are presented
+        or not
+        """
+        return len(self.__list_store) == 0
 
     def length(self):
-        return len(self.__list_store)
+        return self.__presented_passes.get_n_items()
+
+    def pass_with_path(self, path):
+        """
+        Return the pass stored in a file, or None if there is no such pass
+        """
+        return self.__passes_by_path.get(path)
 
     def remove(self, index):
-        self.__list_store.remove(index)
+        self.remove_pass(self.__presented_passes.get_item(index))
 
+    def remove_pass(self, digital_pass):
+        identifier = digital_pass.unique_identifier()
 
-class SortPassesBy:
+        self.__passes_by_identifier.pop(identifier, None)
+        self.__catalog.remove(identifier)
 
-    @classmethod
-    def expiration_date(cls, d1, d2):
+        if self.__passes_by_path.get(digital_pass.get_path()) is digital_pass:
+            del self.__passes_by_path[digital_pass.get_path()]
+
+        found, position = self.__list_store.find(digital_pass)
+        if found:
+            self.__list_store.remove(position)
+
+    def search(self, query):
+        """
+        Present only the passes that match a query. An empty query presents
+        all the passes.
+        """
+        previous_results = self.__search_results
+
+        self.__search_query = query
+        self.__search_results = self.__catalog.search(query)
+
+        if previous_results is None and self.__search_results is None:
+            return
+
+        if previous_results is None:
+            change = Gtk.FilterChange.MORE_STRICT
+        elif self.__search_results is None:
+            change = Gtk.FilterChange.LESS_STRICT
+        elif self.__search_results <= previous_results:
+            change = Gtk.FilterChange.MORE_STRICT
+        elif previous_results <= self.__search_results:
+            change = Gtk.FilterChange.LESS_STRICT
+        else:
+            change = Gtk.FilterChange.DIFFERENT
+
+        self.__search_filter.changed(change)
+
+    def set_sort_order(self, sort_order):
         """
-        Sort passes by expiration date. In the event that two passes have the
-        same expiration date then they will be sorted by description.
+        Sort the presented passes by one of the orders in SortPassesBy
         """
-        dates_comparison = Date.compare_dates(d1.expiration_date(),
-                                              d2.expiration_date())
+        if sort_order == self.__sort_order:
+            return
+
+        self.__sort_order = sort_order
+        self.__presented_passes.set_sorter(SortPassesBy.sorter(sort_order))
+
+    def sort_order(self):
+        return self.__sort_order
+
+
+class SortPassesBy:
+    """
+    The orders passes can be presented in.
+
+    Every order compares the sort keys passes expose as properties, and then
+    their descriptions. Gtk.NumericSorter and Gtk.StringSorter read them once
+    per pass, so switching orders does not compare passes in Python.
+    """
+
+    CREATOR = 'creator'
+    DESCRIPTION = 'description'
+    EXPIRATION_DATE = 'expiration-date'
+    IMPORT_TIME = 'import-time'
+    RELEVANT_DATE = 'relevant-date'
+
+    @staticmethod
+    def __numeric_sorter(property_name, sort_type=Gtk.SortType.ASCENDING):
+        expression = Gtk.PropertyExpression.new(DigitalPass.__gtype__,
+                                                None,
+                                                property_name)
+
+        sorter = Gtk.NumericSorter.new(expression)
+        sorter.set_sort_order(sort_type)
+        return sorter
+
+    @staticmethod
+    def __string_sorter(property_name):
+        expression = Gtk.PropertyExpression.new(DigitalPass.__gtype__,
+                                                None,
+                                                property_name)
+
+        sorter = Gtk.StringSorter.new(expression)
+        sorter.set_ignore_case(True)
+        return sorter
+
+    @classmethod
+    def sorter(cls, sort_order):
+        if sort_order == cls.CREATOR:
+            key_sorter = cls.__string_sorter('sort-creator')
+
+        elif sort_order == cls.DESCRIPTION:
+            key_sorter = None
+
+        elif sort_order == cls.IMPORT_TIME:
+            # Most recently imported passes go first
+            key_sorter = cls.__numeric_sorter('sort-import-time',
+                                              Gtk.SortType.DESCENDING)
+
+        elif sort_order == cls.RELEVANT_DATE:
+            key_sorter = cls.__numeric_sorter('sort-relevant-date')
+
+        else:
+            key_sorter = cls.__numeric_sorter('sort-expiration-date')
+
+        sorter = Gtk.MultiSorter.new()
 
-        d1_is_later_than_d2 = dates_comparison > 0
-        dates_are_equal = dates_comparison == 0
+        if key_sorter:
+            sorter.append(key_sorter)
 
-        return  d1_is_later_than_d2 or \
-                (dates_are_equal and d1.description() > d2.description())
+        sorter.append(cls.__string_sorter('sort-description'))
+        return sorter
@@ -15,8 +15,11 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import json
+
 from .digital_pass import Barcode, Color, Date, DigitalPass, Image, \
                           PassDataExtractor, Date, TimeInterval
+from .pass_format import PassFormat, PassFormatRegistry
 
 
 class EsPass():
@@ -141,12 +144,18 @@ class EsPassAdapter(DigitalPass):
 
         return latest_expiration_date
 
+    def fields(self):
+        return self.__adaptee.front_fields() + self.__adaptee.hidden_fields()
+
     def file_extension():
         return '.espass'
 
     def format(self):
         return 'espass'
 
+    def grouping_identifier(self):
+        return None
+
     def icon(self):
         return self.__adaptee.icon()
 
@@ -156,6 +165,9 @@ class EsPassAdapter(DigitalPass):
     def mime_type():
         return 'application/vnd.espass-espass+zip'
 
+    def relevant_date(self):
+        return None
+
     def unique_identifier(self):
         return '.'.join([self.__adaptee.id(), self.format()])
 
@@ -187,3 +199,39 @@ class EsPassField:
 
     def value(self):
         return self.__value
+
+
+class EsPassFormat(PassFormat):
+
+    identifier = 'espass'
+    adapter = EsPassAdapter
+    file_extension = EsPassAdapter.file_extension()
+    mime_type = EsPassAdapter.mime_type()
+
+    @classmethod
+    def detect(cls, file_names):
+        return 'main.json' in file_names
+
+    @classmethod
+    def parse(cls, archive):
+        """
+        Create an EsPass object from a compressed file
+        """
+
+        pass_data = dict()
+        pass_images = dict()
+
+        for file_name in archive.namelist():
+            if file_name.endswith('.png'):
+                image = archive.read_shared(file_name)
+                pass_images[file_name] = image
+
+            if file_name.endswith('main.json'):
+                json_content = archive.read(file_name)
+                pass_data = json.loads(json_content)
+
+        espass = EsPass(pass_data, pass_images)
+        return EsPassAdapter(espass)
+
+
+PassFormatRegistry.register(EsPassFormat)
@@ -0,0 +1,73 @@
+# lru_cache.py
+#
+# Copyright 2022-2023 Pablo Sánchez Rodríguez
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from collections import OrderedDict
+
+
+class LRUCache:
+    """
+    A mapping that holds a bounded amount of values, discarding the least
+    recently used ones when it is full
+    """
+
+    def __init__(self, capacity):
+        self.__capacity = capacity
+        self.__values = OrderedDict()
+
+    def __contains__(self, key):
+        return key in self.__values
+
+    def __len__(self):
+        return len(self.__values)
+
+    def get(self, key):
+        value = self.__values.get(key)
+
+        if value is not None:
+            self.__values.move_to_end(key)
+
+        return value
+
+    def put(self, key, value):
+        self.__values[key] = value
+        self.__values.move_to_end(key)
+
+        while len(self.__values) > self.__capacity:
+            self.__values.popitem(last=False)
+
+    def get_or_create(self, key, creation_function):
+        """
+        Return the value of a key, creating it with the provided function only
+        if it is not in the cache. Values that cannot be created (i.e. the
+        function returns None) are not cached.
+        """
+        value = self.get(key)
+
+        if value is None:
+            value = creation_function()
+
+            if value is not None:
+                self.put(key, value)
+
+        return value
+
+    def items(self):
+        """
+        Return the (key, value) pairs of the cache, from the least to the most
+        recently used
+        """
+        return list(self.__values.items())
@@ -0,0 +1,396 @@
+# pass_archive.py
+#
+# Copyright 2022-2023 Pablo Sánchez Rodríguez
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import io
+import mmap
+import struct
+import zipfile
+import zlib
+
+from gi.repository import Gio, GLib
+
+
+# Layout of the local file header that precedes the data of every member
+LOCAL_FILE_HEADER = struct.Struct('<4s2B4HL2L2H')
+LOCAL_FILE_HEADER_SIGNATURE = b'PK\003\004'
+
+
+class PassArchive:
+    """
+    A read-only view of the zip archive that contains the files of a pass.
+
+    A PassArchive can be opened from a Gio.File, a Gio.InputStream or a buffer
+    (bytes, bytearray or memoryview). When the archive is backed by a buffer,
+    members stored without compression are served as slices of that buffer
+    instead of being copied.
+
+    Archives in the local filesystem are memory-mapped while they are open,
+    so their members are read from the page cache. Their stored members are
+    copied out of the mapping into GLib.Bytes, which can be handed to
+    Gdk.Texture.new_from_bytes() without any further copy. Nothing keeps
+    the mapping once the archive is closed, since reading a mapping of a file
+    that another program truncates makes the application crash.
+
+    In order to protect the application from malicious or broken files, the
+    resources an archive may use are limited. The sizes declared in the central
+    directory are checked when the archive is opened, and the amount of data
+    actually decompressed is checked again while members are being read.
+    """
+
+    CHUNK_SIZE = 64 * 1024
+
+    # Maximum size of an archive that has to be loaded in memory
+    MAX_ARCHIVE_SIZE = 64 * 1024 * 1024
+
+    MAX_MEMBERS = 1024
+    MAX_MEMBER_SIZE = 32 * 1024 * 1024
+    MAX_TOTAL_SIZE = 64 * 1024 * 1024
+
+    # The compression ratio is only checked for members that are big enough,
+    # since small files full of repeated characters are legitimate
+    MAX_COMPRESSION_RATIO = 100
+    COMPRESSION_RATIO_THRESHOLD = 1024 * 1024
+
+    def __init__(self, file_object, buffer=None, path=None, mapping=None):
+        self.__buffer = buffer
+        self.__mapping = mapping
+        self.__path = path
+        self.__zip_file = zipfile.ZipFile(file_object, 'r')
+        self.__total_read = 0
+
+        try:
+            self.__check_declared_sizes()
+        except Exception:
+            self.__zip_file.close()
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exception_type, exception_value, traceback):
+        self.close()
+
+    def __account(self, amount):
+        """
+        Account for data that has been read from the archive
+        """
+        self.__total_read += amount
+
+        if self.__total_read > self.MAX_TOTAL_SIZE:
+            raise PassTooLarge()
+
+    def __check_declared_sizes(self):
+        members = self.__zip_file.infolist()
+
+        if len(members) > self.MAX_MEMBERS:
+            raise PassTooLarge()
+
+        total_size = 0
+
+        for info in members:
+            if info.file_size > self.MAX_MEMBER_SIZE:
+                raise PassTooLarge()
+
+            if info.file_size > self.COMPRESSION_RATIO_THRESHOLD and \
+               info.file_size > info.compress_size * self.MAX_COMPRESSION_RATIO:
+                raise PassTooLarge()
+
+            total_size += info.file_size
+
+        if total_size > self.MAX_TOTAL_SIZE:
+            raise PassTooLarge()
+
+    def __member_data_offset(self, info):
+        """
+        Return the offset of the data of a member within the buffer
+        """
+        header_start = info.header_offset
+        header_end = header_start + LOCAL_FILE_HEADER.size
+        header = self.__buffer[header_start:header_end]
+
+        if len(header) != LOCAL_FILE_HEADER.size:
+            raise zipfile.BadZipFile()
+
+        fields = LOCAL_FILE_HEADER.unpack(header)
+        signature = fields[0]
+        file_name_length = fields[-2]
+        extra_field_length = fields[-1]
+
+        if signature != LOCAL_FILE_HEADER_SIGNATURE:
+            raise zipfile.BadZipFile()
+
+        return header_end + file_name_length + extra_field_length
+
+    def close(self):
+        self.__zip_file.close()
+
+        if self.__mapping is None:
+            return
+
+        self.__buffer.release()
+
+        try:
+            self.__mapping.close()
+        except BufferError:
+            # A slice of the mapping is still alive. The mapping will be
+            # closed when it gets garbage collected.
+            pass
+
+    def namelist(self):
+        return self.__zip_file.namelist()
+
+    def path(self):
+        """
+        Return the local path of the archive, or None if it is not backed by a
+        file in the local filesystem
+        """
+        return self.__path
+
+    def read(self, name):
+        """
+        Return the content of a member as bytes
+        """
+        info = self.__zip_file.getinfo(name)
+        chunks = []
+        member_size = 0
+
+        # Members are decompressed in chunks, so that a member that is bigger
+        # than declared is rejected before it is completely in memory
+        with self.__zip_file.open(info) as member:
+            chunk = member.read(self.CHUNK_SIZE)
+
+            while chunk:
+                member_size += len(chunk)
+
+                if member_size > self.MAX_MEMBER_SIZE:
+                    raise PassTooLarge()
+
+                self.__account(len(chunk))
+                chunks.append(chunk)
+                chunk = member.read(self.CHUNK_SIZE)
+
+        return b''.join(chunks)
+
+    def read_shared(self, name):
+        """
+        Return the content of a member, sharing memory with the archive whenever
+        possible.
+
+        If the archive is backed by a buffer and the member is stored without
+        compression, a memoryview of the buffer is returned, or a copy in
+        GLib.Bytes if the archive is a memory-mapped file. Otherwise, the
+        member is decompressed into a new bytes object.
+        """
+        info = self.__zip_file.getinfo(name)
+
+        is_plain = info.compress_type == zipfile.ZIP_STORED \
+            and not info.flag_bits & 0x1
+
+        if self.__buffer is None or not is_plain:
+            return self.read(name)
+
+        start = self.__member_data_offset(info)
+        end = start + info.file_size
+
+        if end > len(self.__buffer):
+            raise zipfile.BadZipFile()
+
+        self.__account(info.file_size)
+        member_data = self.__buffer[start:end]
+
+        if zlib.crc32(member_data) != info.CRC:
+            raise zipfile.BadZipFile()
+
+        if self.__mapping is not None:
+            shared_data = GLib.Bytes(member_data.tobytes())
+            member_data.release()
+            return shared_data
+
+        return member_data
+
+    @classmethod
+    def open(cls, source):
+        """
+        Open an archive from a Gio.File, a Gio.InputStream or a buffer
+        """
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            return cls.open_buffer(source)
+
+        if isinstance(source, Gio.InputStream):
+            return cls.open_stream(source)
+
+        if isinstance(source, Gio.File):
+            return cls.open_file(source)
+
+        raise TypeError('Unsupported pass source: %s' % type(source).__name__)
+
+    @classmethod
+    def open_buffer(cls, buffer):
+        buffer = memoryview(buffer).cast('B')
+        return PassArchive(BufferReader(buffer), buffer=buffer)
+
+    @classmethod
+    def open_file(cls, pass_file):
+        path = pass_file.get_path()
+
+        if path:
+            return cls.open_path(path)
+
+        # Files that are not in the local filesystem (e.g. the ones provided by
+        # GVfs) are loaded in memory instead of being written to disk
+        return cls.open_buffer(cls.load_contents(pass_file))
+
+    @classmethod
+    def load_contents(cls, pass_file):
+        """
+        Load the content of a file in memory, as long as it is not too big to
+        be a pass
+        """
+        info = pass_file.query_info(Gio.FILE_ATTRIBUTE_STANDARD_SIZE,
+                                    Gio.FileQueryInfoFlags.NONE,
+                                    None)
+
+        if info.get_size() > cls.MAX_ARCHIVE_SIZE:
+            raise PassTooLarge()
+
+        success, contents, etag = pass_file.load_contents(None)
+        return contents
+
+    @classmethod
+    def open_path(cls, path):
+        with open(path, 'rb') as file:
+            try:
+                mapping = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                # Empty files cannot be mapped
+                raise zipfile.BadZipFile()
+
+        buffer = memoryview(mapping)
+
+        try:
+            return PassArchive(BufferReader(buffer), buffer=buffer,
+                               path=path, mapping=mapping)
+        except Exception:
+            buffer.release()
+            mapping.close()
+            raise
+
+    @classmethod
+    def open_stream(cls, stream):
+        if isinstance(stream, Gio.Seekable) and stream.can_seek():
+            return PassArchive(io.BufferedReader(GioStreamReader(stream)))
+
+        # Zip archives cannot be read sequentially, so streams that cannot seek
+        # are loaded in memory
+        contents = bytearray()
+        chunk = stream.read_bytes(GioStreamReader.CHUNK_SIZE, None)
+
+        while chunk.get_size() > 0:
+            contents += chunk.get_data()
+
+            if len(contents) > cls.MAX_ARCHIVE_SIZE:
+                raise PassTooLarge()
+
+            chunk = stream.read_bytes(GioStreamReader.CHUNK_SIZE, None)
+
+        return cls.open_buffer(contents)
+
+
+class BufferReader(io.RawIOBase):
+    """
+    A seekable file object that reads from a memoryview without copying it
+    """
+
+    def __init__(self, buffer):
+        super().__init__()
+        self.__buffer = buffer
+        self.__position = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, destination):
+        start = self.__position
+        end = min(start + len(destination), len(self.__buffer))
+        amount = max(end - start, 0)
+
+        destination[:amount] = self.__buffer[start:start + amount]
+        self.__position += amount
+        return amount
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            position = offset
+        elif whence == io.SEEK_CUR:
+            position = self.__position + offset
+        elif whence == io.SEEK_END:
+            position = len(self.__buffer) + offset
+        else:
+            raise ValueError('Invalid whence: %s' % whence)
+
+        if position < 0:
+            raise ValueError('Negative seek position: %s' % position)
+
+        self.__position = position
+        return self.__position
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.__position
+
+
+class GioStreamReader(io.RawIOBase):
+    """
+    A file object that reads from a seekable Gio.InputStream
+    """
+
+    CHUNK_SIZE = 64 * 1024
+
+    SEEK_TYPES = {io.SEEK_SET: GLib.SeekType.SET,
+                  io.SEEK_CUR: GLib.SeekType.CUR,
+                  io.SEEK_END: GLib.SeekType.END}
+
+    def __init__(self, stream):
+        super().__init__()
+        self.__stream = stream
+
+    def readable(self):
+        return True
+
+    def readinto(self, destination):
+        data = self.__stream.read_bytes(len(destination), None).get_data()
+        amount = len(data)
+        destination[:amount] = data
+        return amount
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        self.__stream.seek(offset, self.SEEK_TYPES[whence], None)
+        return self.__stream.tell()
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.__stream.tell()
+
+
+class PassTooLarge(Exception):
+    def __init__(self):
+        message = _('Pass is too large')
+        super().__init__(message)
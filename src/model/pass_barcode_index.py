@@ -0,0 +1,112 @@
+# pass_barcode_index.py
+#
+# Copyright 2022-2023 Pablo Sánchez Rodríguez
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import unicodedata
+
+from .digital_pass import Barcode
+
+
+class PassBarcodeIndex:
+    """
+    A map from the barcodes of the passes to their identifiers.
+
+    Barcodes are looked up by their message, and optionally by their format.
+    Both are normalized, so that the same barcode is found whether it comes
+    from a PKPass or an EsPass, and regardless of the line terminator a
+    scanner may add to the message.
+    """
+
+    FORMATS = {
+        'PKBarcodeFormatAztec': 'AZTEC',
+        'PKBarcodeFormatCode128': 'CODE_128',
+        'PKBarcodeFormatPDF417': 'PDF_417',
+        'PKBarcodeFormatQR': 'QR_CODE',
+    }
+
+    def __init__(self):
+        self.__passes_by_barcode = dict()
+        self.__passes_by_message = dict()
+        self.__barcodes_by_pass = dict()
+
+    def __contains__(self, identifier):
+        return identifier in self.__barcodes_by_pass
+
+    def __len__(self):
+        return len(self.__barcodes_by_pass)
+
+    def add(self, identifier, barcodes):
+        """
+        Index a pass by the given (format, message) pairs, which must be
+        normalized, replacing the barcodes it had before
+        """
+        self.remove(identifier)
+
+        barcodes = [tuple(barcode) for barcode in barcodes]
+        self.__barcodes_by_pass[identifier] = barcodes
+
+        for format, message in barcodes:
+            self.__passes_by_barcode[(format, message)] = identifier
+            self.__passes_by_message[message] = identifier
+
+    def remove(self, identifier):
+        barcodes = self.__barcodes_by_pass.pop(identifier, ())
+
+        # Barcodes shared with another pass point to the pass that was added
+        # last, and are kept if it is not this one
+        for format, message in barcodes:
+            if self.__passes_by_barcode.get((format, message)) == identifier:
+                del self.__passes_by_barcode[(format, message)]
+
+            if self.__passes_by_message.get(message) == identifier:
+                del self.__passes_by_message[message]
+
+    def find(self, message, format=None):
+        """
+        Return the identifier of the pass with a barcode, or None if there is
+        no such pass
+        """
+        message = self.normalize_message(message)
+
+        if not format:
+            return self.__passes_by_message.get(message)
+
+        return self.__passes_by_barcode\
+            .get((self.normalize_format(format), message))
+
+    @classmethod
+    def normalize_format(cls, format):
+        return cls.FORMATS.get(format, format)
+
+    @classmethod
+    def normalize_message(cls, message):
+        return unicodedata.normalize('NFC', message).strip()
+
+    @classmethod
+    def barcodes_of(cls, digital_pass):
+        """
+        Return the normalized (format, message) pairs a pass is indexed by
+        """
+        barcodes = []
+
+        for barcode in digital_pass.barcodes():
+            if not isinstance(barcode, Barcode) or not barcode.message():
+                continue
+
+            barcodes.append([cls.normalize_format(barcode.format()),
+                             cls.normalize_message(barcode.message())])
+
+        return barcodes
@@ -0,0 +1,155 @@
+# pass_bundle.py
+#
+# Copyright 2022-2023 Pablo Sánchez Rodríguez
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import logging
+import os
+
+from concurrent.futures import ThreadPoolExecutor
+
+from . import digital_pass_factory
+from .pass_format import PassFormat, PassFormatRegistry
+
+
+class PassBundle:
+    """
+    A set of passes contained in a single file, along with the data of every
+    one of them, and the amount of passes of the file that could not be read
+    """
+
+    def __init__(self, entries, skipped_passes=0):
+        self.__entries = entries
+        self.__skipped_passes = skipped_passes
+
+    def __iter__(self):
+        return iter(self.__entries)
+
+    def __len__(self):
+        return len(self.__entries)
+
+    def passes(self):
+        return [digital_pass for pass_data, digital_pass in self.__entries]
+
+    def skipped_passes(self):
+        return self.__skipped_passes
+
+
+class PKPassesFormat(PassFormat):
+    """
+    A .pkpasses file is a zip archive that bundles several .pkpass files
+    """
+
+    identifier = 'pkpasses'
+    is_bundle = True
+    file_extension = '.pkpasses'
+    mime_type = 'application/vnd.apple.pkpasses'
+
+    @classmethod
+    def detect(cls, file_names):
+        return any(name.endswith('.pkpass') for name in file_names)
+
+    @classmethod
+    def parse(cls, archive):
+        """
+        Create a PassBundle from a compressed file. The passes it contains are
+        parsed in parallel.
+        """
+        member_names = [name for name in archive.namelist()
+                        if name.endswith('.pkpass')]
+
+        # The outer archive is read sequentially, and only the parsing of the
+        # inner passes is distributed among the workers
+        members_data = [archive.read(name) for name in member_names]
+
+        max_workers = min(len(members_data), os.cpu_count() or 1)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            results = executor.map(cls.__parse_member, member_names, members_data)
+            entries = [entry for entry in results if entry]
+
+        if not entries:
+            raise digital_pass_factory.FileIsNotAPass()
+
+        return PassBundle(entries, len(member_names) - len(entries))
+
+    @classmethod
+    def __parse_member(cls, member_name, member_data):
+        try:
+            digital_pass = digital_pass_factory.PassFactory.create(member_data)
+        except Exception as exception:
+            # Invalid passes are skipped so that the rest of the bundle can
+            # still be imported
+            logging.warning('Skipping %s: %s', member_name, exception)
+            return None
+
+        if isinstance(digital_pass, PassBundle):
+            logging.warning('Skipping %s: bundles within bundles are not supported',
+                            member_name)
+            return None
+
+        return member_data, digital_pass
+
+
+class PassBundleImporter:
+    """
+    Import all the passes of a bundle at once.
+
+    Passes in the pass list, or whose identifiers are among the given ones
+    (e.g. those of archived passes), are not imported again.
+    """
+
+    def __init__(self, pass_list, persistence, imported_identifiers=frozenset()):
+        self.__pass_list = pass_list
+        self.__persistence = persistence
+        self.__imported_identifiers = imported_identifiers
+
+    def import_bundle(self, bundle):
+        """
+        Store and insert the passes of a bundle that have not been imported yet,
+        and return them
+        """
+        entries_to_import = []
+        identifiers = set()
+
+        for pass_data, digital_pass in bundle:
+            identifier = digital_pass.unique_identifier()
+
+            if identifier in identifiers or \
+               identifier in self.__imported_identifiers or \
+               digital_pass in self.__pass_list:
+                continue
+
+            identifiers.add(identifier)
+            entries_to_import.append((pass_data, identifier, digital_pass))
+
+        if not entries_to_import:
+            return []
+
+        stored_files = self.__persistence\
+            .save_pass_data_batch([(pass_data, identifier)
+                                   for pass_data, identifier, digital_pass
+                                   in entries_to_import])
+
+        passes_to_import = []
+        for entry, stored_file in zip(entries_to_import, stored_files):
+            digital_pass = entry[2]
+            digital_pass.set_path(stored_file.get_path())
+            passes_to_import.append(digital_pass)
+
+        self.__pass_list.insert_all(passes_to_import)
+        return passes_to_import
+
+
+PassFormatRegistry.register(PKPassesFormat)
@@ -0,0 +1,304 @@
+# pass_catalog.py
+#
+# Copyright 2022-2023 Pablo Sánchez Rodríguez
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import hashlib
+import os
+
+from .pass_barcode_index import PassBarcodeIndex
+from .pass_search_index import PassSearchIndex
+
+
+class PassCatalog:
+    """
+    Metadata of the stored passes that is expensive to compute, kept across
+    sessions.
+
+    Entries are keyed by the unique identifier of their pass and remember the
+    modification time and size of the file they were computed from. Once the
+    file changes, its entry is computed again.
+
+    The catalog also answers searches and barcode lookups on its own, so
+    passes can be found without loading them. Its indices are built from the
+    entries the first time they are needed.
+    """
+
+    def __init__(self, icon_directory=None):
+        self.__entries = dict()
+        self.__icon_directory = icon_directory
+        self.__search_index = None
+        self.__barcode_index = None
+        self.__revision = 0
+
+    def __contains__(self, identifier):
+        return identifier in self.__entries
+
+    def __len__(self):
+        return len(self.__entries)
+
+    @staticmethod
+    def __stamp(digital_pass):
+        path = digital_pass.get_path()
+
+        if not path:
+            return None
+
+        try:
+            file_status = os.stat(path)
+        except OSError:
+            return None
+
+        return [file_status.st_mtime_ns, file_status.st_size]
+
+    def __changed(self):
+        self.__revision += 1
+
+    def __icon_path(self, identifier):
+        file_name = hashlib.sha1(identifier.encode()).hexdigest() + '.png'
+        return os.path.join(self.__icon_directory, file_name)
+
+    def __save_icon(self, digital_pass):
+        """
+        Keep a copy of the icon of a pass, so that it can be shown without
+        opening the pass file
+        """
+        if not self.__icon_directory:
+            return None
+
+        icon = digital_pass.icon()
+        if not icon:
+            return None
+
+        path = self.__icon_path(digital_pass.unique_identifier())
+
+        try:
+            os.makedirs(self.__icon_directory, exist_ok=True)
+            icon.save(path)
+        except OSError:
+            return None
+
+        return path
+
+    def __delete_icon(self, entry):
+        path = entry.get('icon')
+
+        if not path:
+            return
+
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def __index(self):
+        if self.__search_index is None:
+            self.__search_index = PassSearchIndex()
+
+            for identifier, entry in self.__entries.items():
+                self.__search_index.add(identifier, entry['terms'])
+
+        return self.__search_index
+
+    def __barcodes(self):
+        if self.__barcode_index is None:
+            self.__barcode_index = PassBarcodeIndex()
+
+            for identifier, entry in self.__entries.items():
+                self.__barcode_index.add(identifier, entry.get('barcodes', []))
+
+        return self.__barcode_index
+
+    def __add_to_indices(self, identifier, entry):
+        if self.__search_index is not None:
+            self.__search_index.add(identifier, entry['terms'])
+
+        if self.__barcode_index is not None:
+            self.__barcode_index.add(identifier, entry.get('barcodes', []))
+
+    @staticmethod
+    def __is_well_formed(entry):
+        """
+        Return whether an entry loaded from disk has the expected structure
+        """
+        if not isinstance(entry, dict):
+            return False
+
+        stamp = entry.get('stamp')
+        if stamp is not None and \
+           (not isinstance(stamp, list) or len(stamp) != 2 or
+            not all(isinstance(value, int) for value in stamp)):
+            return False
+
+        for key in ['path', 'description', 'creator', 'icon']:
+            if not isinstance(entry.get(key), (str, type(None))):
+                return False
+
+        terms = entry.get('terms')
+        if not isinstance(terms, list) or \
+           not all(isinstance(term, str) for term in terms):
+            return False
+
+        # Entries saved by older versions lack the barcodes
+        barcodes = entry.get('barcodes', [])
+        return isinstance(barcodes, list) and \
+            all(isinstance(barcode, list) and len(barcode) == 2 and
+                all(isinstance(value, str) for value in barcode)
+                for barcode in barcodes)
+
+    def __valid_entry(self, digital_pass):
+        entry = self.__entries.get(digital_pass.unique_identifier())
+
+        if entry is None or entry.get('stamp') is None:
+            return None
+
+        # Entries saved by older versions lack some of the metadata
+        if 'barcodes' not in entry:
+            return None
+
+        if entry['stamp'] != self.__stamp(digital_pass):
+            return None
+
+        return entry
+
+    def entry(self, identifier):
+        """
+        Return the entry of a pass, or None if the pass is not in the catalog
+        """
+        return self.__entries.get(identifier)
+
+    def entries(self):
+        """
+        Return the content of the catalog as a serializable dictionary
+        """
+        return dict(self.__entries)
+
+    def identifiers_in(self, directory):
+        """
+        Return the identifiers of the passes whose files are in a directory,
+        or in any of its subdirectories
+        """
+        prefix = os.path.join(directory, '')
+
+        return {identifier for identifier, entry in self.__entries.items()
+                if entry.get('path') and entry['path'].startswith(prefix)}
+
+    def is_current(self, digital_pass):
+        """
+        Return whether the entry of a pass was computed from its file as it
+        is now
+        """
+        return self.__valid_entry(digital_pass) is not None
+
+    def load_entries(self, entries):
+        for identifier, entry in entries.items():
+            # Entries of a corrupt catalog are computed again when needed
+            if not self.__is_well_formed(entry):
+                continue
+
+            self.__entries[identifier] = entry
+            self.__add_to_indices(identifier, entry)
+
+        self.__changed()
+
+    def find_barcode(self, message, format=None):
+        """
+        Return the identifier of the pass with a barcode, or None if there is
+        no such pass
+        """
+        return self.__barcodes().find(message, format)
+
+    def relocate(self, identifier, path):
+        """
+        Update the entry of a pass whose file has been moved. Moving a file
+        does not change it, so the rest of the entry is still valid.
+        """
+        entry = self.__entries.get(identifier)
+
+        if entry is None or entry.get('path') == path:
+            return
+
+        entry['path'] = path
+        self.__changed()
+
+    def remove(self, identifier):
+        entry = self.__entries.pop(identifier, None)
+
+        if entry is None:
+            return
+
+        self.__delete_icon(entry)
+
+        if self.__search_index is not None:
+            self.__search_index.remove(identifier)
+
+        if self.__barcode_index is not None:
+            self.__barcode_index.remove(identifier)
+
+        self.__changed()
+
+    def retain(self, identifiers):
+        """
+        Remove the entries of the passes that are not in the given collection,
+        e.g. because their files were deleted while the application was closed
+        """
+        for identifier in list(self.__entries):
+            if identifier not in identifiers:
+                self.remove(identifier)
+
+    def revision(self):
+        """
+        Return a number that changes every time the catalog does
+        """
+        return self.__revision
+
+    def search(self, query):
+        """
+        Return the identifiers of the passes that match a query, or None if
+        the query has no words
+        """
+        return self.__index().search(query)
+
+    def search_terms(self, digital_pass):
+        """
+        Return the terms a pass is indexed by, computing them only if the pass
+        has changed since they were computed
+        """
+        entry = self.__valid_entry(digital_pass)
+
+        if entry is None:
+            entry = self.update(digital_pass)
+
+        return entry['terms']
+
+    def update(self, digital_pass):
+        """
+        Compute the entry of a pass again
+        """
+        identifier = digital_pass.unique_identifier()
+
+        entry = {'path': digital_pass.get_path(),
+                 'stamp': self.__stamp(digital_pass),
+                 'description': digital_pass.description(),
+                 'creator': digital_pass.creator(),
+                 'icon': self.__save_icon(digital_pass),
+                 'terms': PassSearchIndex.terms_of(digital_pass),
+                 'barcodes': PassBarcodeIndex.barcodes_of(digital_pass)}
+
+        self.__entries[identifier] = entry
+        self.__add_to_indices(identifier, entry)
+
+        self.__changed()
+        return entry
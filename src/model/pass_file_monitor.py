@@ -0,0 +1,158 @@
+# pass_file_monitor.py
+#
+# Copyright 2022-2023 Pablo Sánchez Rodríguez
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+
+from gi.repository import Gio, GLib
+
+
+class PassFileMonitor:
+    """
+    Report the pass files of a directory that are added, replaced or deleted,
+    e.g. by sync tools.
+
+    Pass files are kept in the subdirectories of the directory, so every one
+    of them is watched too. Subdirectories that appear later are watched as
+    soon as they are created.
+
+    Events are coalesced: a file that is written in several steps, or changes
+    several times in a row, is reported once, after the directory has been
+    quiet for a moment. The callback receives the paths of the files that
+    have been added or changed, and the paths of those that are gone.
+    """
+
+    QUIET_PERIOD = 500 # Milliseconds
+
+    WRITTEN_EVENTS = (Gio.FileMonitorEvent.CHANGED,
+                      Gio.FileMonitorEvent.CHANGES_DONE_HINT,
+                      Gio.FileMonitorEvent.CREATED,
+                      Gio.FileMonitorEvent.MOVED_IN)
+
+    DELETED_EVENTS = (Gio.FileMonitorEvent.DELETED,
+                      Gio.FileMonitorEvent.MOVED_OUT)
+
+    def __init__(self, directory, file_extensions, callback):
+        self.__file_extensions = file_extensions
+        self.__callback = callback
+
+        # The last known state of every file with pending events, i.e.
+        # whether it has been deleted
+        self.__pending_files = dict()
+        self.__source_id = None
+
+        self.__directory = directory
+        self.__monitors = dict()
+        self.__watch(directory)
+
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.is_dir():
+                        self.__watch(entry.path)
+
+        except FileNotFoundError:
+            pass
+
+    def __watch(self, directory):
+        monitor = Gio.File.new_for_path(directory)\
+            .monitor_directory(Gio.FileMonitorFlags.WATCH_MOVES, None)
+        monitor.connect('changed', self.__on_changed)
+
+        self.__monitors[directory] = monitor
+
+    def __on_subdirectory_changed(self, file, event_type):
+        path = file.get_path() if file else None
+
+        if not path or os.path.dirname(path) != self.__directory:
+            return
+
+        if event_type == Gio.FileMonitorEvent.CREATED and \
+           path not in self.__monitors and os.path.isdir(path):
+            self.__watch(path)
+
+            # Files may have been added before the directory was watched
+            try:
+                file_names = os.listdir(path)
+            except OSError:
+                file_names = []
+
+            for file_name in file_names:
+                self.__record(Gio.File.new_for_path(os.path.join(path, file_name)),
+                              deleted=False)
+
+        elif event_type == Gio.FileMonitorEvent.DELETED and \
+             path in self.__monitors:
+            self.__monitors.pop(path).cancel()
+
+    def __on_changed(self, monitor, file, other_file, event_type):
+        self.__on_subdirectory_changed(file, event_type)
+
+        if event_type in self.WRITTEN_EVENTS:
+            self.__record(file, deleted=False)
+
+        elif event_type in self.DELETED_EVENTS:
+            self.__record(file, deleted=True)
+
+        elif event_type == Gio.FileMonitorEvent.RENAMED:
+            self.__record(file, deleted=True)
+            self.__record(other_file, deleted=False)
+
+        else:
+            return
+
+        if self.__source_id is not None:
+            GLib.source_remove(self.__source_id)
+
+        self.__source_id = GLib.timeout_add(self.QUIET_PERIOD, self.__on_quiet)
+
+    def __on_quiet(self):
+        pending_files = self.__pending_files
+
+        self.__pending_files = dict()
+        self.__source_id = None
+
+        if pending_files:
+            written_paths = [path for path, deleted in pending_files.items()
+                             if not deleted]
+            deleted_paths = [path for path, deleted in pending_files.items()
+                             if deleted]
+
+            self.__callback(written_paths, deleted_paths)
+
+        return GLib.SOURCE_REMOVE
+
+    def __record(self, file, deleted):
+        path = file.get_path() if file else None
+
+        if not path:
+            return
+
+        if os.path.splitext(path)[1] not in self.__file_extensions:
+            return
+
+        self.__pending_files[path] = deleted
+
+    def cancel(self):
+        for monitor in self.__monitors.values():
+            monitor.cancel()
+
+        self.__monitors = dict()
+        self.__pending_files = dict()
+
+        if self.__source_id is not None:
+            GLib.source_remove(self.__source_id)
+            self.__source_id = None
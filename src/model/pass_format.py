@@ -0,0 +1,108 @@
+# pass_format.py
+#
+# Copyright 2022-2023 Pablo Sánchez Rodríguez
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+class PassFormat:
+    """
+    A PassFormat describes a file format of digital passes: how to detect it,
+    how to parse it and which DigitalPass adapter represents its passes.
+    """
+
+    # Identifier of the format. It matches DigitalPass.format()
+    identifier = None
+
+    # Adapter class of the passes of this format
+    adapter = None
+
+    # Whether the files of this format contain several passes. The parser of a
+    # bundle returns a PassBundle instead of a DigitalPass.
+    is_bundle = False
+
+    file_extension = None
+    mime_type = None
+
+    @classmethod
+    def detect(cls, file_names):
+        """
+        Return whether an archive belongs to this format by looking at the
+        names of its members, which are read from its central directory
+        """
+        raise NotImplementedError()
+
+    @classmethod
+    def parse(cls, archive):
+        """
+        Create a digital pass, or a PassBundle if the format is a bundle, from
+        a PassArchive
+        """
+        raise NotImplementedError()
+
+
+class PassFormatRegistry:
+    """
+    Registry of the supported pass formats.
+
+    Formats register themselves when their module is imported. Since the model
+    knows nothing about views, plotters are registered separately by the view
+    that plots passes.
+    """
+
+    __formats = []
+    __formats_by_identifier = dict()
+    __plotters = dict()
+
+    @classmethod
+    def detect(cls, archive):
+        """
+        Return the format of an archive, or None if it is not supported
+        """
+        file_names = frozenset(archive.namelist())
+
+        for pass_format in cls.__formats:
+            if pass_format.detect(file_names):
+                return pass_format
+
+        return None
+
+    @classmethod
+    def file_extensions(cls, include_bundles=True):
+        return [pass_format.file_extension for pass_format in cls.__formats
+                if include_bundles or not pass_format.is_bundle]
+
+    @classmethod
+    def format(cls, identifier):
+        return cls.__formats_by_identifier.get(identifier)
+
+    @classmethod
+    def mime_types(cls):
+        return [pass_format.mime_type for pass_format in cls.__formats]
+
+    @classmethod
+    def plotter(cls, identifier):
+        return cls.__plotters.get(identifier)
+
+    @classmethod
+    def register(cls, pass_format):
+        if pass_format.identifier in cls.__formats_by_identifier:
+            return
+
+        cls.__formats.append(pass_format)
+        cls.__formats_by_identifier[pass_format.identifier] = pass_format
+
+    @classmethod
+    def register_plotter(cls, identifier, plotter_constructor):
+        cls.__plotters[identifier] = plotter_constructor
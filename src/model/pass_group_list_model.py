@@ -0,0 +1,246 @@
+# pass_group_list_model.py
+#
+# Copyright 2022-2023 Pablo Sánchez Rodríguez
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import bisect
+
+from gi.repository import Gio, GObject
+
+from .digital_pass import DigitalPass
+
+
+def splice_changes(list_store, new_items):
+    """
+    Make a Gio.ListStore contain the given items, replacing only the range
+    of items that differs, so that views only update the rows that changed
+    """
+    old_length = len(list_store)
+    new_length = len(new_items)
+
+    start = 0
+    while start < min(old_length, new_length) and \
+          list_store.get_item(start) is new_items[start]:
+        start += 1
+
+    old_end = old_length
+    new_end = new_length
+    while old_end > start and new_end > start and \
+          list_store.get_item(old_end - 1) is new_items[new_end - 1]:
+        old_end -= 1
+        new_end -= 1
+
+    if start == old_end and start == new_end:
+        return
+
+    list_store.splice(start, old_end - start, new_items[start:new_end])
+
+
+class PassGroup(GObject.Object):
+    """
+    The passes that share a grouping identifier, in the order they are
+    presented
+    """
+
+    __gtype_name__ = 'PassGroup'
+
+    def __init__(self, grouping_identifier):
+        super().__init__()
+        self.__grouping_identifier = grouping_identifier
+        self.__passes = Gio.ListStore.new(DigitalPass)
+
+    def __contains__(self, digital_pass):
+        identifier = digital_pass.unique_identifier()
+        return any(a_pass.unique_identifier() == identifier
+                   for a_pass in self.__passes)
+
+    def __len__(self):
+        return len(self.__passes)
+
+    def first(self):
+        return self.__passes.get_item(0)
+
+    def grouping_identifier(self):
+        return self.__grouping_identifier
+
+    def passes(self):
+        return self.__passes
+
+    def set_passes(self, passes):
+        splice_changes(self.__passes, passes)
+
+
+class PassGroupListModel(GObject.Object):
+    """
+    The passes of a list model, with those that share a grouping identifier
+    gathered into a PassGroup.
+
+    Every group takes the place of its first pass, and groups of a single
+    pass are presented as the pass itself. When some passes of the list
+    model change, only the groups they belong to are computed again, and
+    only the items of those groups are replaced. Groups keep their identity,
+    so views keep their state.
+    """
+
+    __gtype_name__ = 'PassGroupListModel'
+
+    def __init__(self, pass_model):
+        super().__init__()
+
+        self.__pass_model = pass_model
+        self.__passes = list(pass_model)
+        self.__groups = dict()
+        self.__items = Gio.ListStore.new(GObject.Object)
+
+        # The same items, in a list that is faster to search
+        self.__item_list = []
+
+        self.__regroup()
+        pass_model.connect('items-changed', self.__on_items_changed)
+
+    @staticmethod
+    def __item_of(group):
+        """
+        Return the item a group is presented as, or None if it is empty
+        """
+        if group is None or not len(group):
+            return None
+
+        return group.first() if len(group) == 1 else group
+
+    def __leader_position(self, item):
+        leader = item.first() if isinstance(item, PassGroup) else item
+        return self.__passes.index(leader)
+
+    def __on_items_changed(self, pass_model, position, removed, added):
+        removed_passes = self.__passes[position:position + removed]
+        added_passes = [pass_model.get_item(index)
+                        for index in range(position, position + added)]
+
+        # Sorting the list model again changes all of its passes at once
+        if removed == len(self.__passes):
+            self.__passes = added_passes
+            self.__regroup()
+            return
+
+        self.__passes[position:position + removed] = added_passes
+
+        changed_passes = set(removed_passes) | set(added_passes)
+        stale_items = []
+        new_items = []
+        added_passes_by_group = dict()
+
+        for digital_pass in removed_passes:
+            grouping_identifier = digital_pass.grouping_identifier()
+
+            if not grouping_identifier:
+                stale_items.append(digital_pass)
+            else:
+                added_passes_by_group.setdefault(grouping_identifier, [])
+
+        for digital_pass in added_passes:
+            grouping_identifier = digital_pass.grouping_identifier()
+
+            if not grouping_identifier:
+                new_items.append(digital_pass)
+            else:
+                added_passes_by_group.setdefault(grouping_identifier, [])\
+                    .append(digital_pass)
+
+        for grouping_identifier, group_passes in added_passes_by_group.items():
+            group = self.__groups.get(grouping_identifier)
+            old_item = self.__item_of(group)
+            old_leader = group.first() if old_item is not None else None
+
+            if group is not None:
+                group_passes += [digital_pass for digital_pass in group.passes()
+                                 if digital_pass not in changed_passes]
+
+            if not group_passes:
+                del self.__groups[grouping_identifier]
+                stale_items.append(old_item)
+                continue
+
+            if group is None:
+                group = PassGroup(grouping_identifier)
+                self.__groups[grouping_identifier] = group
+
+            group_passes.sort(key=self.__passes.index)
+            group.set_passes(group_passes)
+            new_item = self.__item_of(group)
+
+            # The item is still in the right place
+            if new_item is old_item and group.first() is old_leader and \
+               old_leader not in changed_passes:
+                continue
+
+            if old_item is not None:
+                stale_items.append(old_item)
+
+            new_items.append(new_item)
+
+        for item in stale_items:
+            index = self.__item_list.index(item)
+            del self.__item_list[index]
+            self.__items.remove(index)
+
+        for item in new_items:
+            index = bisect.bisect_left(self.__item_list,
+                                       self.__leader_position(item),
+                                       key=self.__leader_position)
+            self.__item_list.insert(index, item)
+            self.__items.insert(index, item)
+
+    def __regroup(self):
+        items = []
+        passes_by_group = dict()
+        groups = dict()
+
+        for digital_pass in self.__passes:
+            grouping_identifier = digital_pass.grouping_identifier()
+
+            if not grouping_identifier:
+                items.append(digital_pass)
+                continue
+
+            group_passes = passes_by_group.get(grouping_identifier)
+
+            if group_passes is None:
+                group_passes = []
+                passes_by_group[grouping_identifier] = group_passes
+
+                group = self.__groups.get(grouping_identifier)
+                if group is None:
+                    group = PassGroup(grouping_identifier)
+
+                groups[grouping_identifier] = group
+                items.append(group)
+
+            group_passes.append(digital_pass)
+
+        for grouping_identifier, group in groups.items():
+            group.set_passes(passes_by_group[grouping_identifier])
+
+        self.__groups = groups
+
+        items = [item.first() if isinstance(item, PassGroup) and len(item) == 1
+                 else item
+                 for item in items]
+
+        splice_changes(self.__items, items)
+        self.__item_list = items
+
+    def get_model(self):
+        return self.__items
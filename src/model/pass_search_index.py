@@ -0,0 +1,154 @@
+# pass_search_index.py
+#
+# Copyright 2022-2023 Pablo Sánchez Rodríguez
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import bisect
+import re
+import unicodedata
+
+
+class PassSearchIndex:
+    """
+    An inverted index of the texts of the passes.
+
+    Every term maps to the identifiers of the passes that contain it. Terms
+    are also kept in a sorted list, so that the terms that start with a prefix
+    are found with a binary search instead of a scan of the whole index. New
+    terms are appended to the list, which is sorted again only when it is
+    needed, so that indexing many passes at once is not quadratic.
+    """
+
+    TERM_PATTERN = re.compile(r'\w+')
+
+    def __init__(self):
+        self.__passes_by_term = dict()
+        self.__terms_by_pass = dict()
+        self.__sorted_terms = []
+        self.__terms_are_sorted = True
+
+    def __contains__(self, identifier):
+        return identifier in self.__terms_by_pass
+
+    def __len__(self):
+        return len(self.__terms_by_pass)
+
+    def __sort_terms(self):
+        if not self.__terms_are_sorted:
+            self.__sorted_terms.sort()
+            self.__terms_are_sorted = True
+
+    def __passes_with_prefix(self, prefix):
+        index = bisect.bisect_left(self.__sorted_terms, prefix)
+        matching_passes = set()
+
+        while index < len(self.__sorted_terms):
+            term = self.__sorted_terms[index]
+
+            if not term.startswith(prefix):
+                break
+
+            matching_passes.update(self.__passes_by_term[term])
+            index += 1
+
+        return matching_passes
+
+    def add(self, identifier, terms):
+        """
+        Index a pass by the given terms, replacing the terms it had before
+        """
+        self.remove(identifier)
+
+        terms = frozenset(terms)
+        self.__terms_by_pass[identifier] = terms
+
+        for term in terms:
+            passes = self.__passes_by_term.get(term)
+
+            if passes is None:
+                passes = set()
+                self.__passes_by_term[term] = passes
+                self.__sorted_terms.append(term)
+                self.__terms_are_sorted = False
+
+            passes.add(identifier)
+
+    def remove(self, identifier):
+        terms = self.__terms_by_pass.pop(identifier, ())
+
+        if terms:
+            self.__sort_terms()
+
+        for term in terms:
+            passes = self.__passes_by_term[term]
+            passes.discard(identifier)
+
+            if passes:
+                continue
+
+            del self.__passes_by_term[term]
+            index = bisect.bisect_left(self.__sorted_terms, term)
+            del self.__sorted_terms[index]
+
+    def search(self, query):
+        """
+        Return the identifiers of the passes that contain, for every word of
+        the query, a term that starts with it. Return None if the query has no
+        words, which means that every pass matches.
+        """
+        prefixes = self.terms(query)
+
+        if not prefixes:
+            return None
+
+        self.__sort_terms()
+
+        # Longer prefixes usually match fewer passes, so they go first
+        prefixes = sorted(prefixes, key=len, reverse=True)
+        results = self.__passes_with_prefix(prefixes[0])
+
+        for prefix in prefixes[1:]:
+            if not results:
+                break
+
+            results &= self.__passes_with_prefix(prefix)
+
+        return results
+
+    @classmethod
+    def normalize(cls, text):
+        """
+        Fold the case and remove the accents of a text, so that searches do
+        not depend on them
+        """
+        decomposed_text = unicodedata.normalize('NFKD', text.casefold())
+        return ''.join(character for character in decomposed_text
+                       if not unicodedata.combining(character))
+
+    @classmethod
+    def terms(cls, text):
+        return set(cls.TERM_PATTERN.findall(cls.normalize(text)))
+
+    @classmethod
+    def terms_of(cls, digital_pass):
+        """
+        Return the terms a pass is indexed by
+        """
+        terms = set()
+
+        for text in digital_pass.searchable_texts():
+            terms |= cls.terms(text)
+
+        return sorted(terms)
@@ -15,7 +15,10 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-import os, tempfile
+import hashlib
+import json
+import logging
+import os
 
 from gi.repository import Gio, GLib
 from .digital_pass import DigitalPass
@@ -23,52 +26,429 @@ from .digital_pass import DigitalPass
 
 class PersistenceManager:
     """
+    Pass files are kept in a directory of their own, split into subdirectories
+    (shards) named after the first characters of the hash of the file name.
+    Directories stay small no matter how many passes there are, and a pass
+    file is found from its name without scanning any of them.
+
+    Pass files are replaced through a journal. New versions are written next
+    to the files they replace, and the journal records them before they are
+    written and once they are complete. Replacements that are interrupted,
+    e.g. by a crash, are finished or undone by recover().
     """
 
+    ARCHIVE_DIRECTORY_NAME = 'archive'
+    BARCODE_MATRICES_FILE_NAME = 'barcode-matrices.json'
+    CATALOG_FILE_NAME = 'catalog.json'
+    JOURNAL_FILE_NAME = 'journal.json'
+    PASSES_DIRECTORY_NAME = 'passes'
+    SHARD_NAME_LENGTH = 2
+    TEMPORARY_FILE_EXTENSION = '.tmp'
+
     def __init__(self):
         self.__data_dir = GLib.get_user_data_dir()
         self.__supported_file_extensions = DigitalPass.supported_file_extensions()
+        self.__journal = []
+
+    def archive_directory(self):
+        """
+        Return the directory where the files of archived passes are kept
+        """
+        return os.path.join(self.__data_dir, self.ARCHIVE_DIRECTORY_NAME)
+
+    def archive_pass_file(self, a_pass):
+        """
+        Move the file of a pass into the archive directory
+        """
+        source_path = a_pass.get_path()
+        destination_path = self.__shard_path(self.archive_directory(),
+                                             os.path.basename(source_path))
+
+        os.replace(source_path, destination_path)
+        a_pass.set_path(destination_path)
+
+    def passes_directory(self):
+        """
+        Return the directory where the files of the passes are kept
+        """
+        return os.path.join(self.__data_dir, self.PASSES_DIRECTORY_NAME)
+
+    @classmethod
+    def __shard_path(cls, directory, file_name):
+        """
+        Return the path of a file in the shard of a directory it belongs to,
+        creating the shard if it does not exist
+        """
+        shard_name = hashlib.sha1(file_name.encode()).hexdigest()
+        shard_directory = os.path.join(directory,
+                                       shard_name[:cls.SHARD_NAME_LENGTH])
+
+        os.makedirs(shard_directory, exist_ok=True)
+        return os.path.join(shard_directory, file_name)
+
+    @staticmethod
+    def __synchronize_directory(directory):
+        """
+        Make the files that have been created, renamed or deleted in a
+        directory survive a crash
+        """
+        directory_descriptor = os.open(directory, os.O_RDONLY)
+
+        try:
+            os.fsync(directory_descriptor)
+        finally:
+            os.close(directory_descriptor)
+
+    @staticmethod
+    def __write_file(path, data, mode='wb'):
+        """
+        Write a file and wait until its content is on disk
+        """
+        with open(path, mode) as destination:
+            destination.write(data)
+            destination.flush()
+            os.fsync(destination.fileno())
+
+    def __journal_path(self):
+        return os.path.join(self.__data_dir, self.JOURNAL_FILE_NAME)
+
+    def __save_journal(self):
+        path = self.__journal_path()
+
+        if self.__journal:
+            temp_path = path + self.TEMPORARY_FILE_EXTENSION
+            self.__write_file(temp_path, json.dumps(self.__journal).encode())
+            os.replace(temp_path, path)
+        else:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+        self.__synchronize_directory(self.__data_dir)
+
+    def __is_pass_file(self, entry):
+        extension = os.path.splitext(entry.name)[1]
+        return extension in self.__supported_file_extensions and entry.is_file()
+
+    def load_barcode_matrices(self):
+        """
+        Return the entries of the barcode matrix cache that were saved in a
+        previous session
+        """
+        path = os.path.join(self.__data_dir, self.BARCODE_MATRICES_FILE_NAME)
+
+        try:
+            with open(path, 'r') as cache_file:
+                return json.load(cache_file)
+
+        except (OSError, ValueError):
+            return []
+
+    def save_barcode_matrices(self, entries):
+        path = os.path.join(self.__data_dir, self.BARCODE_MATRICES_FILE_NAME)
+        temp_path = path + '.tmp'
+
+        with open(temp_path, 'w') as cache_file:
+            json.dump(entries, cache_file)
+
+        os.replace(temp_path, path)
+
+    def catalog_icon_directory(self):
+        """
+        Return the directory where the catalog keeps the icons of the passes
+        """
+        return os.path.join(GLib.get_user_cache_dir(), 'catalog-icons')
+
+    def load_catalog(self):
+        """
+        Return the entries of the pass catalog that were saved in a previous
+        session
+        """
+        path = os.path.join(self.__data_dir, self.CATALOG_FILE_NAME)
+
+        try:
+            with open(path, 'r') as catalog_file:
+                entries = json.load(catalog_file)
+
+        except (OSError, ValueError):
+            return {}
+
+        return entries if isinstance(entries, dict) else {}
+
+    def save_catalog(self, entries):
+        path = os.path.join(self.__data_dir, self.CATALOG_FILE_NAME)
+        temp_path = path + '.tmp'
+
+        with open(temp_path, 'w') as catalog_file:
+            json.dump(entries, catalog_file)
+
+        os.replace(temp_path, path)
+
+    def load_pass_files(self, archived=False):
+        directory = self.archive_directory() if archived \
+            else self.passes_directory()
 
-    def load_pass_files(self):
-        file_names = os.listdir(self.__data_dir)
         pass_files = list()
 
-        for file_name in file_names:
-            basename, extension = os.path.splitext(file_name)
+        # The types of the entries come with the directory listing, so no
+        # file has to be queried on its own
+        try:
+            with os.scandir(directory) as shards:
+                shard_paths = [shard.path for shard in shards
+                               if shard.is_dir()]
 
-            if extension not in self.__supported_file_extensions:
-                continue
+        except FileNotFoundError:
+            return []
+
+        for shard_path in shard_paths:
+            try:
+                with os.scandir(shard_path) as entries:
+                    for entry in entries:
+                        if self.__is_pass_file(entry):
+                            pass_files.append(Gio.File.new_for_path(entry.path))
 
-            pass_file_path = os.path.join(self.__data_dir, file_name)
-            pass_file = Gio.File.new_for_path(pass_file_path)
-            pass_files.append(pass_file)
+            except FileNotFoundError:
+                continue
 
         return pass_files
 
+    def migrate_pass_files(self):
+        """
+        Move the pass files stored by older versions, which lay directly in
+        the data and archive directories, into their shards. Return the new
+        paths of the files that have been moved.
+        """
+        migrations = [(self.__data_dir, self.passes_directory()),
+                      (self.archive_directory(), self.archive_directory())]
+
+        moved_paths = []
+
+        for source_directory, destination_directory in migrations:
+            try:
+                with os.scandir(source_directory) as entries:
+                    pass_files = [entry for entry in entries
+                                  if self.__is_pass_file(entry)]
+
+            except FileNotFoundError:
+                continue
+
+            for entry in pass_files:
+                try:
+                    destination_path = self.__shard_path(destination_directory,
+                                                         entry.name)
+                    os.replace(entry.path, destination_path)
+
+                except OSError as error:
+                    # The file will be moved the next time
+                    logging.warning('Unable to migrate %s: %s', entry.path, error)
+                    continue
+
+                moved_paths.append(destination_path)
+
+        return moved_paths
+
+    def recover(self):
+        """
+        Finish the replacements of pass files whose new versions were complete
+        when they were interrupted, and undo the rest
+        """
+        try:
+            with open(self.__journal_path(), 'r') as journal_file:
+                journal = json.load(journal_file)
+
+        except (OSError, ValueError):
+            journal = []
+
+        if not isinstance(journal, list):
+            journal = []
+
+        self.__journal = []
+        directories = set()
+
+        for entry in journal:
+            if not isinstance(entry, dict) or \
+               not isinstance(entry.get('source'), str) or \
+               not isinstance(entry.get('destination'), str):
+                continue
+
+            source_path = entry['source']
+            destination_path = entry['destination']
+
+            # Either the replacement happened or its new version was never
+            # written
+            if not os.path.exists(source_path):
+                continue
+
+            try:
+                if entry.get('committed'):
+                    os.replace(source_path, destination_path)
+                else:
+                    os.remove(source_path)
+
+            except OSError as error:
+                # The entry will be recovered the next time
+                logging.warning('Unable to recover %s: %s', source_path, error)
+                self.__journal.append(entry)
+                continue
+
+            directories.add(os.path.dirname(source_path))
+
+        for directory in directories:
+            self.__synchronize_directory(directory)
+
+        if journal:
+            self.__save_journal()
+
+        self.__delete_unjournaled_files()
+
+    def __delete_unjournaled_files(self):
+        """
+        Delete the new versions of passes that were left behind by updates
+        that the journal does not know about, e.g. those of older versions of
+        the application, which kept them in the data directory
+        """
+        journaled_paths = {entry['source'] for entry in self.__journal}
+        directories = [self.__data_dir]
+
+        for directory in [self.passes_directory(), self.archive_directory()]:
+            try:
+                with os.scandir(directory) as shards:
+                    directories += [shard.path for shard in shards
+                                    if shard.is_dir()]
+
+            except FileNotFoundError:
+                continue
+
+        for directory in directories:
+            try:
+                with os.scandir(directory) as entries:
+                    temp_paths = [entry.path for entry in entries
+                                  if self.__is_temporary_pass_file(entry)]
+
+            except FileNotFoundError:
+                continue
+
+            for temp_path in temp_paths:
+                if temp_path in journaled_paths:
+                    continue
+
+                try:
+                    os.remove(temp_path)
+                except OSError:
+                    pass
+
+    def __is_temporary_pass_file(self, entry):
+        pass_file_name, extension = os.path.splitext(entry.name)
+
+        return extension == self.TEMPORARY_FILE_EXTENSION and \
+               os.path.splitext(pass_file_name)[1] in self.__supported_file_extensions and \
+               entry.is_file()
+
     def delete_pass_file(self, a_pass):
         target_path = a_pass.get_path()
         target_file = Gio.File.new_for_path(target_path)
         target_file.delete()
 
     def replace_pass_file(self, pass_to_replace, replacement):
-        source_path = replacement.get_path()
+        self.replace_pass_files([(pass_to_replace, replacement)])
+
+    def replace_pass_files(self, replacements):
+        """
+        Replace the files of several passes with the files of their new
+        versions, which have been saved by stage_pass_data().
+
+        The journal is written once for the whole batch, and so is every
+        directory involved.
+        """
+        source_paths = {replacement.get_path()
+                        for pass_to_replace, replacement in replacements}
+
+        for entry in self.__journal:
+            if entry['source'] in source_paths:
+                entry['committed'] = True
+
+        self.__save_journal()
+
+        directories = set()
+
+        for pass_to_replace, replacement in replacements:
+            destination_path = pass_to_replace.get_path()
+
+            os.replace(replacement.get_path(), destination_path)
+            replacement.set_path(destination_path)
+
+            directories.add(os.path.dirname(destination_path))
+
+        for directory in directories:
+            self.__synchronize_directory(directory)
+
+        self.__journal = [entry for entry in self.__journal
+                          if entry['source'] not in source_paths]
+        self.__save_journal()
+
+    def stage_pass_data(self, pass_data, pass_to_replace):
+        """
+        Save the new version of a pass next to the file it will replace, so
+        that replace_pass_file() can swap them atomically
+        """
         destination_path = pass_to_replace.get_path()
+        source_path = destination_path + self.TEMPORARY_FILE_EXTENSION
+
+        self.__journal.append({'source': source_path,
+                               'destination': destination_path,
+                               'committed': False})
+        self.__save_journal()
 
-        os.remove(destination_path)
-        os.rename(source_path, destination_path)
+        self.__write_file(source_path, pass_data)
+        return Gio.File.new_for_path(source_path)
 
-        replacement.set_path(destination_path)
+    def __save_pass_data(self, pass_data, file_name):
+        destination_file_path = self.__shard_path(self.passes_directory(),
+                                                  file_name)
+
+        try:
+            self.__write_file(destination_file_path, pass_data, mode='xb')
+        except FileExistsError:
+            raise FileAlreadyImported()
+
+        return Gio.File.new_for_path(destination_file_path)
 
     def save_pass_data(self, pass_data, file_name):
-        with tempfile.NamedTemporaryFile() as temp_pass_file:
-            temp_pass_file.write(pass_data)
+        stored_file = self.__save_pass_data(pass_data, file_name)
+        self.__synchronize_directory(os.path.dirname(stored_file.get_path()))
+
+        return stored_file
+
+    def save_pass_data_batch(self, pass_data_list):
+        """
+        Save a list of (pass data, file name) pairs. Either all of them are
+        saved or none of them is.
+        """
+        stored_files = []
+
+        try:
+            for pass_data, file_name in pass_data_list:
+                stored_file = self.__save_pass_data(pass_data, file_name)
+                stored_files.append(stored_file)
 
-            pass_file_path = os.path.join(tempfile.gettempdir(), str(temp_pass_file.name))
-            pass_file = Gio.File.new_for_path(pass_file_path)
-            return self.save_pass_file(pass_file, file_name)
+        except Exception:
+            for stored_file in stored_files:
+                stored_file.delete()
+            raise
+
+        # Every directory is synchronized once for the whole batch
+        directories = {os.path.dirname(stored_file.get_path())
+                       for stored_file in stored_files}
+
+        for directory in directories:
+            self.__synchronize_directory(directory)
+
+        return stored_files
 
     def save_pass_file(self, pass_file, file_name):
-        destination_file_path = os.path.join(self.__data_dir, file_name)
+        destination_file_path = self.__shard_path(self.passes_directory(),
+                                                  file_name)
         destination_file = Gio.File.new_for_path(destination_file_path)
 
         if Gio.File.query_exists(destination_file):
@@ -80,6 +460,11 @@ class PersistenceManager:
                        progress_callback=None,
                        progress_callback_data=None)
 
+        with open(destination_file_path, 'rb') as destination:
+            os.fsync(destination.fileno())
+
+        self.__synchronize_directory(os.path.dirname(destination_file_path))
+
         return destination_file
 
 
@@ -15,9 +15,29 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import json
+import re
+
 from gi.repository import Gdk, Gtk
 
 from .digital_pass import Barcode, Color, Currency, Date, DigitalPass, Image, PassDataExtractor
+from .pass_format import PassFormat, PassFormatRegistry
+
+
+def decode_string(string):
+    encodings = ['utf-8', 'utf-16']
+    decoded_string = ''
+
+    for encoding in encodings:
+        try:
+            decoded_string = string.decode(encoding)
+        except UnicodeDecodeError:
+            pass
+
+    if not decoded_string:
+        raise UnknownEncoding()
+
+    return decoded_string
 
 
 class PKPass:
@@ -230,12 +250,29 @@ class PKPassAdapter(DigitalPass):
     def expiration_date(self):
         return self.__adaptee.expiration_date()
 
+    def fields(self):
+        return self.__adaptee.header_fields() + \
+               self.__adaptee.primary_fields() + \
+               self.__adaptee.secondary_fields() + \
+               self.__adaptee.auxiliary_fields() + \
+               self.__adaptee.back_fields()
+
     def file_extension():
         return '.pkpass'
 
     def format(self):
         return 'pkpass'
 
+    def grouping_identifier(self):
+        grouping_identifier = self.__adaptee.grouping_identifier()
+
+        if not grouping_identifier:
+            return None
+
+        # Grouping identifiers are only meaningful for passes of the same type
+        return '.'.join([self.__adaptee.pass_type_identifier(),
+                         grouping_identifier])
+
     def icon(self):
         return self.__adaptee.icon()
 
@@ -245,6 +282,18 @@ class PKPassAdapter(DigitalPass):
     def mime_type():
         return 'application/vnd.apple.pkpass'
 
+    def relevant_date(self):
+        return self.__adaptee.relevant_date()
+
+    def searchable_texts(self):
+        texts = super().searchable_texts()
+
+        logo_text = self.__adaptee.logo_text()
+        if logo_text:
+            texts.append(logo_text)
+
+        return texts
+
     def unique_identifier(self):
         return '.'.join([self.__adaptee.pass_type_identifier(),
                          self.__adaptee.serial_number(),
@@ -314,3 +363,99 @@ class StandardField:
 
     def text_alignment(self):
         return self.__text_alignment
+
+
+class PKPassFormat(PassFormat):
+
+    identifier = 'pkpass'
+    adapter = PKPassAdapter
+    file_extension = PKPassAdapter.file_extension()
+    mime_type = PKPassAdapter.mime_type()
+
+    @classmethod
+    def detect(cls, file_names):
+        return 'pass.json' in file_names
+
+    @classmethod
+    def parse(cls, archive):
+        """
+        Create a PKPass object from a compressed file
+        """
+
+        manifest_text = archive.read('manifest.json')
+        manifest = json.loads(manifest_text)
+
+        pass_data = dict()
+        pass_translations = dict()
+        pass_images = dict()
+
+        for file_name in sorted(manifest.keys()):
+            if file_name.endswith('.png'):
+                # For every type of image (background, footer, icon, logo, strip
+                # and thumbnail), only load the image with lowest resolution
+
+                image_type = re.split('\.|@', file_name)[0]
+
+                if image_type in pass_images.keys():
+                    continue
+
+                pass_images[image_type] = archive.read_shared(file_name)
+
+            if file_name.endswith('pass.strings'):
+                language = file_name.split('.')[0]
+                file_content = archive.read(file_name)
+                translation_dict = cls.__create_translation_dict(file_content)
+                pass_translations[language] = translation_dict
+
+            if file_name.endswith('pass.json'):
+                json_content = archive.read(file_name)
+                pass_data = json.loads(json_content)
+
+
+        language_to_import = None
+        if pass_translations:
+            user_language = Gtk.get_default_language().to_string()
+
+            for language in pass_translations:
+                if language in user_language:
+                    language_to_import = language
+                    break
+
+            if language_to_import is None:
+                # TODO: Open a dialogue and ask the user what language to import
+                pass
+
+        pass_translation = None
+        if language_to_import:
+            pass_translation = pass_translations[language_to_import]
+
+        pkpass = PKPass(pass_data, pass_translation, pass_images)
+        return PKPassAdapter(pkpass)
+
+    @classmethod
+    def __create_translation_dict(cls, translation_file_content):
+        content = decode_string(translation_file_content)
+        entries = content.split('\n')
+
+        translation_dict = dict()
+
+        for entry in entries:
+            result = re.search('"(.*)" = "(.*)"', entry)
+
+            if not result or len(result.groups()) != 2:
+                continue
+
+            translation_key = result.group(1)
+            translation_value = result.group(2)
+            translation_dict[translation_key] = translation_value
+
+        return translation_dict
+
+
+class UnknownEncoding(Exception):
+    def __init__(self):
+        message = _('Unknown file encoding')
+        super().__init__(message)
+
+
+PassFormatRegistry.register(PKPassFormat)
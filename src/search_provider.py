@@ -0,0 +1,127 @@
+# search_provider.py
+#
+# Copyright 2022-2023 Pablo Sánchez Rodríguez
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from gi.repository import Gio, GLib
+
+from .dbus_object import DBusObject
+
+
+SEARCH_PROVIDER_XML = '''
+<node>
+  <interface name="org.gnome.Shell.SearchProvider2">
+    <method name="GetInitialResultSet">
+      <arg type="as" name="terms" direction="in"/>
+      <arg type="as" name="results" direction="out"/>
+    </method>
+    <method name="GetSubsearchResultSet">
+      <arg type="as" name="previous_results" direction="in"/>
+      <arg type="as" name="terms" direction="in"/>
+      <arg type="as" name="results" direction="out"/>
+    </method>
+    <method name="GetResultMetas">
+      <arg type="as" name="identifiers" direction="in"/>
+      <arg type="aa{sv}" name="metas" direction="out"/>
+    </method>
+    <method name="ActivateResult">
+      <arg type="s" name="identifier" direction="in"/>
+      <arg type="as" name="terms" direction="in"/>
+      <arg type="u" name="timestamp" direction="in"/>
+    </method>
+    <method name="LaunchSearch">
+      <arg type="as" name="terms" direction="in"/>
+      <arg type="u" name="timestamp" direction="in"/>
+    </method>
+  </interface>
+</node>
+'''
+
+
+class SearchProvider(DBusObject):
+    """
+    Answer the searches of GNOME Shell with the passes of the catalog.
+
+    Results come from the terms, descriptions and icons the catalog keeps, so
+    pass files are never opened and searches are fast even if the application
+    has just been started by the Shell.
+    """
+
+    INTERFACE_XML = SEARCH_PROVIDER_XML
+    OBJECT_PATH_SUFFIX = '/SearchProvider'
+
+    def __init__(self, application, catalog):
+        super().__init__(application)
+        self.__catalog = catalog
+
+    def __search(self, terms):
+        results = self.__catalog.search(' '.join(terms))
+
+        if not results:
+            return []
+
+        return sorted(results, key=self.__sort_key)
+
+    def __sort_key(self, identifier):
+        description = self.__catalog.entry(identifier).get('description')
+        return (description or '').casefold(), identifier
+
+    def __icon(self, entry):
+        path = entry.get('icon')
+
+        if path and GLib.file_test(path, GLib.FileTest.EXISTS):
+            return Gio.FileIcon.new(Gio.File.new_for_path(path))
+
+        return Gio.ThemedIcon.new(self._application.get_application_id())
+
+    # D-Bus methods
+
+    def get_initial_result_set(self, terms):
+        return GLib.Variant('(as)', (self.__search(terms),))
+
+    def get_subsearch_result_set(self, previous_results, terms):
+        # Refining a search never adds results, and the order of the previous
+        # ones is kept
+        results = self.__catalog.search(' '.join(terms)) or set()
+        results = [identifier for identifier in previous_results
+                   if identifier in results]
+
+        return GLib.Variant('(as)', (results,))
+
+    def get_result_metas(self, identifiers):
+        metas = []
+
+        for identifier in identifiers:
+            entry = self.__catalog.entry(identifier)
+
+            if entry is None:
+                continue
+
+            metas.append({
+                'id': GLib.Variant('s', identifier),
+                'name': GLib.Variant('s', entry.get('description') or ''),
+                'description': GLib.Variant('s', entry.get('creator') or ''),
+                'gicon': GLib.Variant('s', self.__icon(entry).to_string()),
+            })
+
+        return GLib.Variant('(aa{sv})', (metas,))
+
+    def activate_result(self, identifier, terms, timestamp):
+        self._application.present_pass(identifier)
+        return None
+
+    def launch_search(self, terms, timestamp):
+        self._application.present_search(' '.join(terms))
+        return None
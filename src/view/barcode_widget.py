@@ -15,107 +15,450 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-from gi.repository import Adw, Gdk, Graphene, Gsk, Gtk
+import re
 
-from .barcode_content_encoder import BarcodeContentEncoder
-from .digital_pass import Color
+from concurrent.futures import Future, ThreadPoolExecutor
+from gi.repository import Adw, Gdk, GLib, GObject, Graphene, Gsk, Gtk
 
+from .barcode_content_encoder import BarcodeContentEncoder, BarcodeEncodingError, BarcodeType
+from .barcode_matrix_cache import BarcodeMatrixCache
+from .digital_pass import Color
 
-class BarcodeWidget(Gtk.Widget):
 
-    __gtype_name__ = 'BarcodeWidget'
+class BarcodePlotter:
+    """
+    A BarcodePlotter draws an encoded barcode into a snapshot, at any size.
+    It does not need a widget, so barcodes can also be drawn offscreen.
+    """
 
-    FOREGROUND = '1';
-    BACKGROUND = '2';
+    FOREGROUND = BarcodeContentEncoder.FOREGROUND_MODULE
+    BACKGROUND = BarcodeContentEncoder.BACKGROUND_MODULE
 
-    def __init__(self):
-        super().__init__()
+    # Scaled textures can be drawn with nearest-neighbor filtering since GTK
+    # 4.10. Older versions draw the barcode as a set of horizontal runs.
+    CAN_SCALE_TEXTURES = hasattr(Gtk.Snapshot, 'append_scaled_texture')
 
-        self.__data = []
-        self.__data_width = 0
-        self.__data_height = 0
+    def __init__(self, matrix=None, margin_size=4):
+        module_list, width, height = matrix if matrix else ([], 0, 0)
 
-        # Set background color to white
-        self.__background_color = Color.named('white').as_gdk_rgba()
+        self.__data = module_list
+        self.__data_width = width
+        self.__data_height = height
 
         # Set foreground color to black
-        self.__foreground_color = Color.named('black').as_gdk_rgba()
+        self.__foreground = Color.named('black')
+        self.__foreground_color = self.__foreground.as_gdk_rgba()
 
         # Amount of barcode dots/modules that should fit in every margin (either
         # horizontal or vertical)
-        self.__margin_size = 4
+        self.__margin_size = margin_size
+
+        # The barcode is rendered once into either a texture or a list of
+        # (row, column, length) runs of foreground modules
+        self.__texture = None
+        self.__runs = []
+
+        if BarcodePlotter.CAN_SCALE_TEXTURES:
+            self.__texture = self.__create_texture()
+        else:
+            self.__runs = self.__create_runs()
+
+    def __create_runs(self):
+        """
+        Merge the horizontally adjacent foreground modules of every row
+        """
+        runs = []
+
+        run_pattern = re.compile(bytes([BarcodePlotter.FOREGROUND]) + b'+')
+
+        for row in range(self.__data_height):
+            row_start = row * self.__data_width
+            row_modules = self.__data[row_start:row_start + self.__data_width]
+
+            for run in run_pattern.finditer(row_modules):
+                runs.append((row, run.start(), run.end() - run.start()))
+
+        return runs
+
+    def __create_texture(self):
+        """
+        Create a texture with one pixel per module. Background modules are
+        transparent.
+        """
+        amount_of_modules = self.__data_width * self.__data_height
+
+        if amount_of_modules == 0:
+            return None
+
+        # Foreground modules are opaque and the rest are transparent
+        alpha_table = bytes(255 if byte == BarcodePlotter.FOREGROUND else 0
+                            for byte in range(256))
+        alpha = bytes(self.__data).translate(alpha_table)
+
+        pixels = bytearray(4 * amount_of_modules)
+        pixels[0::4] = bytes([self.__foreground.red()]) * amount_of_modules
+        pixels[1::4] = bytes([self.__foreground.green()]) * amount_of_modules
+        pixels[2::4] = bytes([self.__foreground.blue()]) * amount_of_modules
+        pixels[3::4] = alpha
+
+        return Gdk.MemoryTexture.new(self.__data_width,
+                                     self.__data_height,
+                                     Gdk.MemoryFormat.R8G8B8A8,
+                                     GLib.Bytes(bytes(pixels)),
+                                     4 * self.__data_width)
 
     def aspect_ratio(self):
         return (self.__data_width + self.__margin_size) / (self.__data_height + self.__margin_size)
 
-    def do_snapshot(self, snapshot):
-        canvas_width = self.get_allocated_width()
-        canvas_height = self.get_allocated_height()
+    def minimum_height(self):
+        return self.__data_height + 2 * self.__margin_size
+
+    def minimum_width(self):
+        return self.__data_width + 2 * self.__margin_size
 
-        barcode_width = self.__data_width + 2 * self.__margin_size
-        barcode_height = self.__data_height + 2 * self.__margin_size
+    def plot(self, snapshot, canvas_width, canvas_height):
+        """
+        Draw the barcode centered in a canvas of the given size
+        """
+        barcode_width = self.minimum_width()
+        barcode_height = self.minimum_height()
 
         h_scaling = canvas_width / barcode_width
         v_scaling = canvas_height / barcode_height
         scaling_factor = int(min(h_scaling, v_scaling))
 
+        snapshot.save()
+
         translation = Graphene.Point()
         translation.x = (canvas_width - barcode_width * scaling_factor) / 2
         translation.y = (canvas_height - barcode_height * scaling_factor) / 2
         snapshot.translate(translation)
 
+        # Draw the barcode
+        if self.__texture:
+            rectangle = Graphene.Rect()
+            rectangle.init(self.__margin_size * scaling_factor,
+                           self.__margin_size * scaling_factor,
+                           self.__data_width * scaling_factor,
+                           self.__data_height * scaling_factor)
+
+            snapshot.append_scaled_texture(self.__texture,
+                                           Gsk.ScalingFilter.NEAREST,
+                                           rectangle)
+            snapshot.restore()
+            return
+
         snapshot.scale(scaling_factor, scaling_factor)
 
+        for row, column, length in self.__runs:
+            rectangle = Graphene.Rect()
+            rectangle.init(column + self.__margin_size,
+                           row + self.__margin_size,
+                           length,
+                           1)
+            snapshot.append_color(self.__foreground_color, rectangle)
+
+        snapshot.restore()
+
+    @staticmethod
+    def barcode_type(format):
+        """
+        Return the type the native encoder knows a barcode format by
+        """
+        if format in ['AZTEC', 'PKBarcodeFormatAztec']:
+            return BarcodeType.AZTEC
 
-        # Draw the barcode
-        for i in range(self.__data_height):
-            for j in range(self.__data_width):
+        if format in ['CODE_128', 'PKBarcodeFormatCode128']:
+            return BarcodeType.CODE128
+
+        if format in ['PDF_417', 'PKBarcodeFormatPDF417']:
+            return BarcodeType.PDF417
+
+        if format in ['PKBarcodeFormatQR', 'QR_CODE']:
+            return BarcodeType.QRCODE
+
+        raise BarcodeFormatNotSupported()
+
+    @staticmethod
+    def encoding_parameters(format):
+        """
+        Return the function that encodes a barcode format and the size of the
+        margin that surrounds its barcodes
+        """
+        if format in ['AZTEC', 'PKBarcodeFormatAztec']:
+            return BarcodeContentEncoder.encode_aztec_code, 2
+
+        if format in ['CODE_128', 'PKBarcodeFormatCode128']:
+            return BarcodeContentEncoder.encode_code128_code, 7
+
+        if format in ['PDF_417', 'PKBarcodeFormatPDF417']:
+            return BarcodeContentEncoder.encode_pdf417_code, 2
+
+        if format in ['PKBarcodeFormatQR', 'QR_CODE']:
+            return BarcodeContentEncoder.encode_qr_code, 4
+
+        raise BarcodeFormatNotSupported()
+
+    @classmethod
+    def new(cls, format, message, encoding):
+        """
+        Create the plotter of a barcode, encoding it if it is not in the cache
+        """
+        encoding_function, margin_size = cls.encoding_parameters(format)
 
-                is_foreground = \
-                    self.__data[i * self.__data_width + j] == BarcodeWidget.FOREGROUND
+        matrix = BarcodeMatrixCache.default()\
+            .get_or_encode(format, message, encoding, encoding_function)
 
-                if not is_foreground:
-                    continue
+        return BarcodePlotter(matrix, margin_size)
 
-                rectangle = Graphene.Rect()
-                rectangle.init(j + self.__margin_size,
-                               i + self.__margin_size,
-                               1,
-                               1)
-                snapshot.append_color(self.__foreground_color, rectangle)
+
+class BarcodeWidget(Gtk.Widget):
+
+    __gtype_name__ = 'BarcodeWidget'
+
+    # Barcodes that are not in the cache are encoded by this worker, so that
+    # the main thread never waits for the native encoder
+    __encoder = ThreadPoolExecutor(max_workers=1)
+
+    # Barcodes that are likely to be displayed next are encoded by a worker
+    # of their own, so that they never delay the barcode that is displayed
+    __prefetcher = ThreadPoolExecutor(max_workers=1)
+
+    # The encodings that have not finished yet, by (format, message, encoding),
+    # so that a barcode is never encoded twice at the same time
+    __encodings = dict()
+    __prefetch_encodings = []
+
+    def __init__(self):
+        super().__init__()
+
+        self.__pending_encoding = None
+        self.__plotter = BarcodePlotter()
+
+    @GObject.Signal(arg_types=(bool,))
+    def encoding_finished(self, success):
+        pass
+
+    def aspect_ratio(self):
+        return self.__plotter.aspect_ratio()
+
+    def do_snapshot(self, snapshot):
+        self.__plotter.plot(snapshot,
+                            self.get_allocated_width(),
+                            self.get_allocated_height())
+
+    @classmethod
+    def __encode_in(cls, executor, format, message, encoding):
+        """
+        Return the future of the encoding of a barcode, submitting it to an
+        executor unless it is already being encoded
+        """
+        key = (format, message, encoding)
+        future = cls.__encodings.get(key)
+
+        if future is not None and not future.cancelled():
+            return future
+
+        encoding_function, margin_size = BarcodePlotter.encoding_parameters(format)
+        future = executor.submit(encoding_function, message, encoding)
+        cls.__track(key, future)
+
+        return future
+
+    @classmethod
+    def __track(cls, key, future):
+        cls.__encodings[key] = future
+
+        future.add_done_callback(
+            lambda future: GLib.idle_add(cls.__on_encoding_done, key, future))
+
+    @staticmethod
+    def __encode_batch(futures_by_key):
+        """
+        Encode the barcodes whose futures have not been cancelled with a
+        single call to the native encoder
+        """
+        keys = [key for key, future in futures_by_key.items()
+                if future.set_running_or_notify_cancel()]
+
+        if not keys:
+            return
+
+        barcodes = [(message, BarcodePlotter.barcode_type(format), encoding)
+                    for format, message, encoding in keys]
+
+        try:
+            module_list, layout = BarcodeContentEncoder.encode_barcodes(barcodes)
+        except Exception as exception:
+            for key in keys:
+                futures_by_key[key].set_exception(exception)
+            return
+
+        for key, barcode_layout in zip(keys, layout):
+            if barcode_layout is None:
+                futures_by_key[key].set_exception(BarcodeEncodingError())
+                continue
+
+            # Every matrix gets a copy of its own, so that the cache does not
+            # keep the buffer of the whole batch
+            offset, width, height = barcode_layout
+            modules = memoryview(bytes(module_list[offset:offset + width * height]))
+            futures_by_key[key].set_result((modules, width, height))
+
+    @classmethod
+    def __on_encoding_done(cls, key, future):
+        if cls.__encodings.get(key) is future:
+            del cls.__encodings[key]
+
+        if not future.cancelled() and future.exception() is None:
+            BarcodeMatrixCache.default().put(*key, future.result())
+
+        return GLib.SOURCE_REMOVE
+
+    def __on_encoded(self, future, margin_size):
+        # Results of encodings that have been cancelled or superseded are
+        # discarded
+        if future is not self.__pending_encoding:
+            return GLib.SOURCE_REMOVE
+
+        self.__pending_encoding = None
+
+        if future.cancelled() or future.exception() is not None:
+            self.emit('encoding_finished', False)
+            return GLib.SOURCE_REMOVE
+
+        self.__set_plotter(BarcodePlotter(future.result(), margin_size))
+        self.emit('encoding_finished', True)
+
+        return GLib.SOURCE_REMOVE
+
+    def __set_plotter(self, plotter):
+        self.__plotter = plotter
+        self.queue_draw()
+
+    def cancel_encoding(self):
+        """
+        Cancel the encoding started by encode_async(), if any
+        """
+        if self.__pending_encoding is None:
+            return
+
+        self.__pending_encoding.cancel()
+        self.__pending_encoding = None
 
     def encode(self, format, message, encoding):
-        encoding_function = None
+        self.cancel_encoding()
+        self.__set_plotter(BarcodePlotter.new(format, message, encoding))
 
-        if format in ['AZTEC', 'PKBarcodeFormatAztec']:
-            encoding_function = BarcodeContentEncoder.encode_aztec_code
-            self.__margin_size = 2
+    @classmethod
+    def cancel_prefetches(cls):
+        """
+        Cancel the prefetches that have not started yet
+        """
+        for future in cls.__prefetch_encodings:
+            future.cancel()
 
-        elif format in ['CODE_128', 'PKBarcodeFormatCode128']:
-            encoding_function = BarcodeContentEncoder.encode_code128_code
-            self.__margin_size = 7
+        cls.__prefetch_encodings = []
 
-        elif format in ['PDF_417', 'PKBarcodeFormatPDF417']:
-            encoding_function = BarcodeContentEncoder.encode_pdf417_code
-            self.__margin_size = 2
+    @classmethod
+    def prefetch_all(cls, barcodes):
+        """
+        Encode several barcodes, given as (format, message, encoding) tuples,
+        in the background with a single call to the native encoder
+        """
+        futures_by_key = dict()
 
-        elif format in ['PKBarcodeFormatQR', 'QR_CODE']:
-            encoding_function = BarcodeContentEncoder.encode_qr_code
+        for key in barcodes:
+            if key in futures_by_key or key in cls.__encodings or \
+               BarcodeMatrixCache.default().get(*key):
+                continue
 
-        else:
-            raise BarcodeFormatNotSupported()
+            try:
+                BarcodePlotter.barcode_type(key[0])
+            except BarcodeFormatNotSupported:
+                continue
 
-        module_list, width, height = encoding_function(message, encoding)
+            futures_by_key[key] = Future()
 
-        self.__data = module_list
-        self.__data_width = width
-        self.__data_height = height
+        if not futures_by_key:
+            return
+
+        cls.__prefetch_encodings = [future for future in cls.__prefetch_encodings
+                                    if not future.done()]
+
+        for key, future in futures_by_key.items():
+            cls.__track(key, future)
+            cls.__prefetch_encodings.append(future)
+
+        cls.__prefetcher.submit(cls.__encode_batch, futures_by_key)
+
+    @classmethod
+    def prefetch(cls, format, message, encoding):
+        """
+        Encode a barcode in the background, so that it is already in the cache
+        when it is displayed
+        """
+        if BarcodeMatrixCache.default().get(format, message, encoding):
+            return
+
+        future = cls.__encode_in(cls.__prefetcher, format, message, encoding)
+
+        cls.__prefetch_encodings = [future for future in cls.__prefetch_encodings
+                                    if not future.done()]
+        cls.__prefetch_encodings.append(future)
+
+    def encode_async(self, format, message, encoding):
+        """
+        Encode a barcode in a worker thread, unless it is already in the cache.
+
+        The encoding_finished signal is emitted in the main thread once the
+        barcode is ready. Starting a new encoding supersedes the previous one,
+        and a barcode that is being prefetched is not encoded again. Return
+        whether the barcode was ready right away.
+        """
+        self.cancel_encoding()
+
+        encoding_function, margin_size = BarcodePlotter.encoding_parameters(format)
+
+        matrix = BarcodeMatrixCache.default().get(format, message, encoding)
+
+        if matrix is not None:
+            self.__set_plotter(BarcodePlotter(matrix, margin_size))
+            return True
+
+        future = self.__encode_in(self.__encoder, format, message, encoding)
+
+        # A prefetch that has not started yet would wait behind the other
+        # prefetches, so the barcode is encoded right away instead
+        if future in self.__prefetch_encodings and future.cancel():
+            future = self.__encode_in(self.__encoder, format, message, encoding)
+
+        self.__pending_encoding = future
+
+        future.add_done_callback(
+            lambda future: GLib.idle_add(self.__on_encoded, future, margin_size))
+
+        return False
+
+    @staticmethod
+    def predicted_aspect_ratio(format):
+        """
+        Return the approximate aspect ratio of the barcodes of a format, which
+        is known before they are encoded
+        """
+        if format in ['CODE_128', 'PKBarcodeFormatCode128']:
+            return 4
+
+        if format in ['PDF_417', 'PKBarcodeFormatPDF417']:
+            return 3
+
+        return 1
 
     def minimum_height(self):
-        return self.__data_height + 2 * self.__margin_size
+        return self.__plotter.minimum_height()
 
     def minimum_width(self):
-        return self.__data_width + 2 * self.__margin_size
+        return self.__plotter.minimum_width()
 
 
 class BarcodeFormatNotSupported(Exception):
@@ -0,0 +1,96 @@
+# pass_group_row.py
+#
+# Copyright 2022-2023 Pablo Sánchez Rodríguez
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from gi.repository import Gtk
+
+from .pass_icon import PassIcon
+from .pass_row_header import PassRowHeader
+
+
+@Gtk.Template(resource_path='/me/sanchezrodriguez/passes/pass_group_row.ui')
+class PassGroupRow(Gtk.ListBoxRow):
+    """
+    The header of a group of passes, which shows or hides them when it is
+    activated. Rows for the passes are only created once it is expanded.
+    """
+
+    __gtype_name__ = 'PassGroupRow'
+
+    icon = Gtk.Template.Child()
+    title = Gtk.Template.Child()
+    subtitle = Gtk.Template.Child()
+    expander_icon = Gtk.Template.Child()
+
+    def __init__(self, tree_row, group):
+        super().__init__()
+        self.__tree_row = tree_row
+        self.__group = group
+
+        # Groups keep their identity while their passes change, so the row
+        # follows them
+        self.__passes_changed_handler = group.passes()\
+            .connect('items-changed', self._on_passes_changed)
+        self._on_passes_changed(group.passes(), 0, 0, 0)
+
+        tree_row.connect('notify::expanded', self._on_expanded_changed)
+        self._on_expanded_changed(tree_row, None)
+
+    def do_unroot(self):
+        if self.__passes_changed_handler:
+            self.__group.passes().disconnect(self.__passes_changed_handler)
+            self.__passes_changed_handler = None
+
+        Gtk.ListBoxRow.do_unroot(self)
+
+    def _on_expanded_changed(self, tree_row, __):
+        self.expander_icon.set_from_icon_name('pan-down-symbolic'
+                                              if tree_row.get_expanded()
+                                              else 'pan-end-symbolic')
+
+    def _on_passes_changed(self, passes, position, removed, added):
+        first_pass = self.__group.first()
+
+        if not first_pass:
+            return
+
+        self.icon.set_image(first_pass.icon())
+
+        if first_pass.background_color():
+            self.icon.set_background_color(first_pass.background_color())
+
+        self.title.set_label(first_pass.description())
+
+        amount_of_passes = len(self.__group)
+        self.subtitle.set_label(ngettext('{} pass', '{} passes',
+                                         amount_of_passes)
+                                .format(amount_of_passes))
+
+    def data(self):
+        return self.__group.first()
+
+    def group(self):
+        return self.__group
+
+    def hide_header(self):
+        self.set_header(None)
+
+    def show_header(self):
+        header = PassRowHeader(self.data())
+        self.set_header(header)
+
+    def toggle(self):
+        self.__tree_row.set_expanded(not self.__tree_row.get_expanded())
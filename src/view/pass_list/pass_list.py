@@ -17,6 +17,8 @@
 
 from gi.repository import Adw, Gtk
 
+from .pass_group_list_model import PassGroup, PassGroupListModel
+from .pass_group_row import PassGroupRow
 from .pass_row import PassRow
 
 
@@ -29,24 +31,87 @@ class PassList(Gtk.ListBox):
         super().__init__()
 
         self.__selected_row = None
+        self.__date_headers = True
+        self.__tree_model = None
+        self.__tree_models = dict()
         self.set_header_func(self.on_update_header)
 
         # Create a placeholder widget to be displayed when the list is empty
-        placeholder = Adw.StatusPage.new()
-        placeholder.set_icon_name('me.sanchezrodriguez.passes')
-        placeholder.set_title(_('You have no passes'))
-        placeholder.set_description(_('Use the “+” button to import a pass'))
-        self.set_placeholder(placeholder)
+        self.__empty_placeholder = Adw.StatusPage.new()
+        self.__empty_placeholder.set_icon_name('me.sanchezrodriguez.passes')
+        self.__empty_placeholder.set_title(_('You have no passes'))
+        self.__empty_placeholder.set_description(_('Use the “+” button to import a pass'))
+
+        # Another one to be displayed when no pass has been archived
+        self.__empty_archive_placeholder = Adw.StatusPage.new()
+        self.__empty_archive_placeholder.set_icon_name('me.sanchezrodriguez.passes')
+        self.__empty_archive_placeholder.set_title(_('No archived passes'))
+        self.__empty_archive_placeholder.set_description(_('Passes are archived once they expire'))
+
+        # And another one to be displayed when no pass matches a search
+        self.__no_results_placeholder = Adw.StatusPage.new()
+        self.__no_results_placeholder.set_icon_name('system-search-symbolic')
+        self.__no_results_placeholder.set_title(_('No results found'))
+
+        self.__archived = False
+        self.__searching = False
+        self.__update_placeholder()
 
         self.connect('row-activated', self.on_row_activated)
 
+    def __update_placeholder(self):
+        if self.__searching:
+            self.set_placeholder(self.__no_results_placeholder)
+        elif self.__archived:
+            self.set_placeholder(self.__empty_archive_placeholder)
+        else:
+            self.set_placeholder(self.__empty_placeholder)
+
     def bind_model(self, pass_list_model):
-        super().bind_model(pass_list_model.get_model(), PassRow)
+        model = pass_list_model.get_model()
+
+        # Passes that belong together are gathered under a row that expands
+        # into them. Groups are kept for every model the list has presented,
+        # so switching between models does not group passes again.
+        if model not in self.__tree_models:
+            pass_groups = PassGroupListModel(model)
+            tree_model = Gtk.TreeListModel.new(pass_groups.get_model(),
+                                               False,
+                                               False,
+                                               self.__create_child_model)
+
+            self.__tree_models[model] = (pass_groups, tree_model)
+
+        self.__tree_model = self.__tree_models[model][1]
+        self.__selected_row = None
+
+        super().bind_model(self.__tree_model, self.__create_row)
+
+    @staticmethod
+    def __create_child_model(item):
+        return item.passes() if isinstance(item, PassGroup) else None
+
+    @staticmethod
+    def __create_row(tree_row):
+        item = tree_row.get_item()
+
+        if isinstance(item, PassGroup):
+            return PassGroupRow(tree_row, item)
+
+        return PassRow(item)
 
     def on_row_activated(self, pass_list, pass_row):
+        if isinstance(pass_row, PassGroupRow):
+            pass_row.toggle()
+            return
+
         self.__selected_row = pass_row
 
     def on_update_header(self, row, row_above):
+        if not self.__date_headers:
+            row.hide_header()
+            return
+
         row_date = row.data().expiration_date()
         row_header = row_date.as_relative_pretty_string() if row_date else None
 
@@ -59,15 +124,58 @@ class PassList(Gtk.ListBox):
         else:
             row.hide_header()
 
-    def select_pass_at_index(self, index):
-        selected_row = self.get_row_at_index(index)
-
-        if not selected_row:
-            selected_row = self.get_row_at_index(0)
-
-        if selected_row:
-            self.select_row(selected_row)
-            self.emit('row-activated', selected_row)
+    def set_date_headers(self, date_headers):
+        """
+        Set whether passes are grouped under headers with their expiration
+        date, which only makes sense if they are sorted by it
+        """
+        if date_headers == self.__date_headers:
+            return
+
+        self.__date_headers = date_headers
+        self.invalidate_headers()
+
+    def set_archived(self, archived):
+        """
+        Set whether the passes in the list are the archived ones
+        """
+        self.__archived = archived
+        self.__update_placeholder()
+
+    def set_searching(self, searching):
+        """
+        Set whether the passes in the list are the results of a search
+        """
+        self.__searching = searching
+        self.__update_placeholder()
+
+    def select_pass(self, a_pass):
+        """
+        Select the row of a pass, expanding its group if it has one
+        """
+        if not self.__tree_model:
+            return
+
+        identifier = a_pass.unique_identifier()
+        position = 0
+
+        # The rows of the passes of a group come right after the group, once
+        # it is expanded
+        while position < self.__tree_model.get_n_items():
+            tree_row = self.__tree_model.get_row(position)
+            item = tree_row.get_item()
+
+            if isinstance(item, PassGroup):
+                if not tree_row.get_expanded() and a_pass in item:
+                    tree_row.set_expanded(True)
+
+            elif item.unique_identifier() == identifier:
+                selected_row = self.get_row_at_index(position)
+                self.select_row(selected_row)
+                self.emit('row-activated', selected_row)
+                return
+
+            position += 1
 
     def selected_pass(self):
         selected_pass = None
@@ -77,14 +185,6 @@ class PassList(Gtk.ListBox):
 
         return selected_pass
 
-    def selected_pass_index(self):
-        index = None
-
-        if self.__selected_row:
-            index = self.__selected_row.get_index()
-
-        return index
-
 
 
     
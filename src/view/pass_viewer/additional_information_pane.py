@@ -15,9 +15,9 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-from gi.repository import Adw, Gtk
+from gi.repository import Adw, Gio, Gtk
 
-from .pass_field_row import PassFieldRow
+from .pass_field_row import PassFieldItem, PassFieldRow
 
 
 @Gtk.Template(resource_path='/me/sanchezrodriguez/passes/additional_information_pane.ui')
@@ -38,14 +38,32 @@ class AdditionalInformationPane(Gtk.Box):
         placeholder.add_css_class('background')
         self.fields.set_placeholder(placeholder)
 
+        # Rows are bound to the items of this model. Selecting another pass
+        # updates the items in place, so the existing rows are reused.
+        self.__field_items = Gio.ListStore.new(PassFieldItem)
+        self.fields.bind_model(self.__field_items, self.__create_row)
+
+        # Rows whose item has been removed, waiting to display another item
+        self.__spare_rows = []
+
+    def __create_row(self, item):
+        row = self.__spare_rows.pop() if self.__spare_rows else PassFieldRow()
+        row.bind(item)
+        return row
+
+    def __recycle_rows(self, first_index, amount):
+        for index in range(first_index, first_index + amount):
+            row = self.fields.get_row_at_index(index)
+
+            if row:
+                row.unbind()
+                self.__spare_rows.append(row)
+
     def clean(self):
-        row = self.fields.get_row_at_index(0)
-        while row:
-            self.fields.remove(row)
-            row = self.fields.get_row_at_index(0)
+        self.__recycle_rows(0, self.__field_items.get_n_items())
+        self.__field_items.remove_all()
 
     def content(self, a_pass):
-        self.clean()
         fields = a_pass.additional_information()
 
         if len(fields) == 0:
@@ -59,11 +77,20 @@ class AdditionalInformationPane(Gtk.Box):
 
         self.fields.set_valign(alignment)
 
-        for field in fields:
-            label = field.label()
-            value = field.value()
+        amount_of_items = self.__field_items.get_n_items()
+        amount_of_fields = len(fields)
+
+        # Update the fields that are already displayed
+        for index in range(min(amount_of_items, amount_of_fields)):
+            self.__field_items.get_item(index).update(fields[index])
+
+        # Add or remove the rest
+        if amount_of_fields > amount_of_items:
+            new_items = [PassFieldItem(field)
+                         for field in fields[amount_of_items:]]
+            self.__field_items.splice(amount_of_items, 0, new_items)
 
-            passFieldRow = PassFieldRow()
-            passFieldRow.set_label(label)
-            passFieldRow.set_value(value)
-            self.fields.append(passFieldRow)
+        elif amount_of_fields < amount_of_items:
+            amount_to_remove = amount_of_items - amount_of_fields
+            self.__recycle_rows(amount_of_fields, amount_to_remove)
+            self.__field_items.splice(amount_of_fields, amount_to_remove, [])
@@ -17,7 +17,36 @@
 
 import re
 
-from gi.repository import GLib, Gtk
+from gi.repository import GLib, GObject, Gtk
+
+
+class PassFieldItem(GObject.Object):
+    """
+    A field of a pass, as an item of a Gio.ListStore
+    """
+
+    __gtype_name__ = 'PassFieldItem'
+
+    label = GObject.Property(type=str, default='')
+    value = GObject.Property(type=str, default='')
+
+    def __init__(self, field):
+        super().__init__()
+        self.update(field)
+
+    def update(self, field):
+        """
+        Show another field. Properties are only set when they change, so rows
+        bound to this item are only updated when needed.
+        """
+        label = field.label() or ''
+        value = str(field.value())
+
+        if self.props.label != label:
+            self.props.label = label
+
+        if self.props.value != value:
+            self.props.value = value
 
 
 @Gtk.Template(resource_path='/me/sanchezrodriguez/passes/pass_field_row.ui')
@@ -32,6 +61,36 @@ class PassFieldRow(Gtk.ListBoxRow):
         super().__init__()
         self.value.set_use_markup(True)
 
+        self.__item = None
+        self.__handler_ids = []
+
+    def __on_label_changed(self, item, parameter):
+        self.set_label(item.props.label)
+
+    def __on_value_changed(self, item, parameter):
+        self.set_value(item.props.value)
+
+    def bind(self, item):
+        """
+        Display a PassFieldItem, and keep displaying it as it changes
+        """
+        self.unbind()
+
+        self.__item = item
+        self.__handler_ids = [
+            item.connect('notify::label', self.__on_label_changed),
+            item.connect('notify::value', self.__on_value_changed)]
+
+        self.set_label(item.props.label)
+        self.set_value(item.props.value)
+
+    def unbind(self):
+        for handler_id in self.__handler_ids:
+            self.__item.disconnect(handler_id)
+
+        self.__item = None
+        self.__handler_ids = []
+
     def set_label(self, label):
         if label and label.strip():
             self.label.set_text(label)
@@ -0,0 +1,91 @@
+# pass_prefetcher.py
+#
+# Copyright 2022-2023 Pablo Sánchez Rodríguez
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from gi.repository import GLib
+
+from .barcode_widget import BarcodeWidget
+
+
+class PassPrefetcher:
+    """
+    Prepare passes that are likely to be displayed next while the application
+    is idle.
+
+    The work of prefetching a pass is done by PassWidget.prefetch(), and its
+    results are kept in the bounded caches of textures, render nodes and
+    barcode matrices. Only one pass is prepared per main loop iteration, so
+    that user input is never delayed by more than that.
+
+    Barcodes are encoded by a worker of their own, all of them with a single
+    call to the native encoder, and the encodings that have not started yet
+    are cancelled along with the prefetch.
+    """
+
+    def __init__(self, pass_widget):
+        self.__pass_widget = pass_widget
+        self.__pending_passes = []
+        self.__source_id = None
+
+    def __on_idle(self):
+        a_pass = self.__pending_passes.pop(0)
+
+        try:
+            self.__pass_widget.prefetch(a_pass)
+        except Exception:
+            # The pass will report the error when it gets displayed
+            pass
+
+        if self.__pending_passes:
+            return GLib.SOURCE_CONTINUE
+
+        self.__source_id = None
+        return GLib.SOURCE_REMOVE
+
+    def cancel(self):
+        self.__pending_passes = []
+        BarcodeWidget.cancel_prefetches()
+
+        if self.__source_id is not None:
+            GLib.source_remove(self.__source_id)
+            self.__source_id = None
+
+    def prefetch(self, passes):
+        """
+        Prepare the given passes, in order. Passes that were waiting to be
+        prepared and are not in the list are discarded.
+        """
+        self.cancel()
+        self.__pending_passes = list(passes)
+
+        if not self.__pending_passes:
+            return
+
+        # The barcodes of all the passes are encoded at once
+        barcodes = []
+        for a_pass in self.__pending_passes:
+            pass_barcodes = a_pass.barcodes()
+
+            if pass_barcodes:
+                barcode = pass_barcodes[0]
+                barcodes.append((barcode.format(),
+                                 barcode.message(),
+                                 barcode.message_encoding()))
+
+        BarcodeWidget.prefetch_all(barcodes)
+
+        self.__source_id = GLib.idle_add(self.__on_idle,
+                                         priority=GLib.PRIORITY_LOW)
@@ -0,0 +1,231 @@
+# pass_renderer.py
+#
+# Copyright 2022-2023 Pablo Sánchez Rodríguez
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import builtins
+import cairo
+import gettext
+import gi
+import multiprocessing
+import os
+
+# Worker processes import this module on their own, before anything else has
+# chosen the versions of the libraries
+gi.require_version('Adw', '1')
+gi.require_version('Gdk', '4.0')
+gi.require_version('Gsk', '4.0')
+gi.require_version('Gtk', '4.0')
+gi.require_version('PangoCairo', '1.0')
+
+from concurrent.futures import ProcessPoolExecutor
+from gi.repository import Gio, Graphene, Gsk, Gtk, PangoCairo
+
+from .barcode_widget import BarcodePlotter
+from .digital_pass import Color
+from .digital_pass_factory import PassFactory
+from .pass_widget import PASS_HEIGHT, PASS_WIDTH, PassPlotter, PassWidget
+
+
+class OffscreenCanvas:
+    """
+    The surface a PassPlotter draws on when there is no PassWidget. It
+    provides what plotters would otherwise ask the widget for.
+    """
+
+    def __init__(self, scale_factor=1):
+        self.__scale_factor = scale_factor
+        self.__pango_context = PangoCairo.FontMap.get_default().create_context()
+
+    def get_native(self):
+        # There is no renderer offscreen, so effects are drawn as they are
+        return None
+
+    def get_pango_context(self):
+        return self.__pango_context
+
+    def get_scale_factor(self):
+        return self.__scale_factor
+
+
+class PassRenderer:
+    """
+    Render passes into PNG or SVG images without a window.
+
+    Passes are drawn by the same plotters as the PassWidget, along with their
+    barcode, so images look like the passes shown by the application.
+    """
+
+    # Radius of the corners of the pass (the 'card' style) and of the barcode
+    # (a button)
+    PASS_RADIUS = 12
+    BARCODE_RADIUS = 6
+
+    IMAGE_FORMATS = ['png', 'svg']
+
+    def __init__(self, scale_factor=1):
+        self.__canvas = OffscreenCanvas(scale_factor)
+        self.__scale_factor = scale_factor
+
+    def __plot_barcode(self, snapshot, a_pass):
+        barcodes = a_pass.barcodes()
+        barcode = barcodes[0] if barcodes else None
+
+        if not barcode:
+            return
+
+        barcode_plotter = BarcodePlotter.new(barcode.format(),
+                                             barcode.message(),
+                                             barcode.message_encoding())
+
+        width, height = PassWidget.barcode_size(barcode_plotter)
+        x, y = PassWidget.barcode_position(width, height)
+
+        snapshot.save()
+
+        point = Graphene.Point()
+        point.x = x
+        point.y = y
+        snapshot.translate(point)
+
+        rectangle = Graphene.Rect()
+        rectangle.init(0, 0, width, height)
+
+        rounded_rectangle = Gsk.RoundedRect()
+        rounded_rectangle.init_from_rect(rectangle, self.BARCODE_RADIUS)
+
+        snapshot.push_rounded_clip(rounded_rectangle)
+        snapshot.append_color(Color.named('white').as_gdk_rgba(), rectangle)
+        barcode_plotter.plot(snapshot, width, height)
+        snapshot.pop()
+
+        snapshot.restore()
+
+    def render_node(self, a_pass):
+        """
+        Return a render node with the pass and its barcode
+        """
+        snapshot = Gtk.Snapshot()
+
+        rectangle = Graphene.Rect()
+        rectangle.init(0, 0, PASS_WIDTH, PASS_HEIGHT)
+
+        rounded_rectangle = Gsk.RoundedRect()
+        rounded_rectangle.init_from_rect(rectangle, self.PASS_RADIUS)
+
+        snapshot.push_rounded_clip(rounded_rectangle)
+        PassPlotter.new(a_pass, self.__canvas).plot(snapshot)
+        self.__plot_barcode(snapshot, a_pass)
+        snapshot.pop()
+
+        return snapshot.to_node()
+
+    def render(self, a_pass, path):
+        """
+        Render a pass into a file, whose format depends on its extension
+        """
+        if path.lower().endswith('.svg'):
+            self.render_svg(a_pass, path)
+        else:
+            self.render_png(a_pass, path)
+
+    def render_png(self, a_pass, path):
+        surface = cairo.ImageSurface(cairo.FORMAT_ARGB32,
+                                     PASS_WIDTH * self.__scale_factor,
+                                     PASS_HEIGHT * self.__scale_factor)
+
+        context = cairo.Context(surface)
+        context.scale(self.__scale_factor, self.__scale_factor)
+        self.render_node(a_pass).draw(context)
+
+        surface.flush()
+        surface.write_to_png(path)
+        surface.finish()
+
+    def render_svg(self, a_pass, path):
+        surface = cairo.SVGSurface(path, PASS_WIDTH, PASS_HEIGHT)
+
+        context = cairo.Context(surface)
+        self.render_node(a_pass).draw(context)
+
+        surface.flush()
+        surface.finish()
+
+    @classmethod
+    def render_files(cls, pass_paths, output_directory, image_format='png',
+                     scale_factor=1, processes=None):
+        """
+        Render several pass files in parallel worker processes.
+
+        Every pass is rendered into a file of the output directory named after
+        the pass file. Return a list with, for every pass, either the path of
+        its image or the RenderingError that prevented it from being rendered.
+        """
+        if image_format not in cls.IMAGE_FORMATS:
+            raise ValueError('Unsupported image format: %s' % image_format)
+
+        tasks = []
+        for pass_path in pass_paths:
+            name = os.path.splitext(os.path.basename(pass_path))[0]
+            image_path = os.path.join(output_directory,
+                                      '%s.%s' % (name, image_format))
+            tasks.append((pass_path, image_path, scale_factor))
+
+        if not tasks:
+            return []
+
+        # GLib does not survive a fork once its threads are running, so
+        # workers start a new interpreter instead
+        context = multiprocessing.get_context('spawn')
+        max_workers = min(len(tasks), processes or os.cpu_count() or 1)
+
+        with ProcessPoolExecutor(max_workers=max_workers,
+                                 mp_context=context,
+                                 initializer=_initialize_worker) as executor:
+            futures = [executor.submit(_render_file, task) for task in tasks]
+
+            return [future.exception() or future.result()
+                    for future in futures]
+
+
+class RenderingError(Exception):
+    def __init__(self, pass_path, message):
+        super().__init__(pass_path, message)
+        self.pass_path = pass_path
+        self.message = message
+
+    def __str__(self):
+        return '{}: {}'.format(self.pass_path, self.message)
+
+
+def _initialize_worker():
+    # Error messages are translated through the '_' builtin, which is set up
+    # by the launcher of the application
+    if not hasattr(builtins, '_'):
+        builtins._ = gettext.gettext
+
+
+def _render_file(task):
+    pass_path, image_path, scale_factor = task
+
+    try:
+        a_pass = PassFactory.create(Gio.File.new_for_path(pass_path))
+        PassRenderer(scale_factor).render(a_pass, image_path)
+    except Exception as exception:
+        # Errors of the libraries cannot be sent back to the application, so
+        # only their messages are
+        raise RenderingError(pass_path, str(exception)) from None
+
+    return image_path
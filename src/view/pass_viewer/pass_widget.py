@@ -19,6 +19,9 @@ from gi.repository import Adw, Gdk, GObject, Graphene, Gsk, Gtk, Pango
 
 from .barcode_widget import BarcodeWidget
 from .digital_pass import Color
+from .lru_cache import LRUCache
+from .pass_format import PassFormatRegistry
+from .texture_cache import TextureCache
 
 
 PASS_WIDTH = 320
@@ -70,22 +73,38 @@ class FieldLayout:
         self.__value.set_width(width)
         self.__label.set_width(width)
 
+        # Width the field takes on its own, before it is stretched
+        self.__natural_width = width / Pango.SCALE
+
+        # Measuring a layout is expensive, so heights are only measured again
+        # after the width changes
+        self.__label_height = None
+        self.__value_height = None
+
+    def __measure(self):
+        if self.__label_height is None:
+            self.__label_height = self.__label.get_pixel_size().height
+            self.__value_height = self.__value.get_pixel_size().height
+
     def append(self, snapshot, label_color, value_color):
-        label_height = self.__label.get_pixel_size().height
-        value_height = self.__value.get_pixel_size().height
+        self.__measure()
 
         snapshot.save()
         snapshot.append_layout(self.__label, label_color)
 
         point = Graphene.Point()
-        point.y = label_height
+        point.y = self.__label_height
         snapshot.translate(point)
 
         snapshot.append_layout(self.__value, value_color)
         snapshot.restore()
 
     def get_height(self):
-        return self.__label.get_pixel_size().height + self.__value.get_pixel_size().height
+        self.__measure()
+        return self.__label_height + self.__value_height
+
+    def get_natural_width(self):
+        return self.__natural_width
 
     def get_width(self):
         return self.__label.get_width() / Pango.SCALE
@@ -98,14 +117,29 @@ class FieldLayout:
         self.__label.set_width(width * Pango.SCALE)
         self.__value.set_width(width * Pango.SCALE)
 
+        self.__label_height = None
+        self.__value_height = None
+
 
 class PassPlotter:
 
     def __init__(self, a_pass, pass_widget):
+        self._pass = a_pass
         self._pass_widget = pass_widget
         self._pango_context = pass_widget.get_pango_context()
 
+        # The text of a pass is shaped and packed into rows the first time the
+        # pass is plotted, and reused every time it is plotted again
+        self.__field_layouts = dict()
+        self.__rows = dict()
+
     def _create_fields_layouts(self, fields):
+        # Fields belong to the pass, so they outlive this plotter
+        key = tuple(id(field) for field in fields)
+
+        if key in self.__rows:
+            return self.__rows[key]
+
         rows = []
         spacing_per_row = []
 
@@ -136,8 +170,28 @@ class PassPlotter:
             spacing_per_row.append(spacing)
             rows.append(current_row)
 
+        self.__rows[key] = (rows, spacing_per_row)
         return rows, spacing_per_row
 
+    def _field_layout(self,
+                      field,
+                      label_font = PassFont.label,
+                      value_font = PassFont.value,
+                      alignment = Pango.Alignment.LEFT):
+        """
+        Return the layout of a field, creating it only the first time it is
+        requested
+        """
+        key = (id(field), id(label_font), id(value_font), alignment)
+        field_layout = self.__field_layouts.get(key)
+
+        if field_layout is None:
+            field_layout = FieldLayout(self._pango_context, field,
+                                       label_font, value_font, alignment)
+            self.__field_layouts[key] = field_layout
+
+        return field_layout
+
     def _plot_background(self):
         rectangle = Graphene.Rect()
         rectangle.init(0, 0, PASS_WIDTH, PASS_HEIGHT)
@@ -154,9 +208,8 @@ class PassPlotter:
         row_height = 0
         rows, spacing_per_row = self._create_fields_layouts(fields)
 
-        for row in rows:
+        for row, spacing in zip(rows, spacing_per_row):
             row_height = 0
-            spacing = spacing_per_row.pop(0)
             amount_of_fields = len(row)
 
             self._snapshot.save()
@@ -198,11 +251,21 @@ class PassPlotter:
         point.y = row_height * len(rows) + PASS_MARGIN
         self._snapshot.translate(point)
 
+    def _texture(self, name, image):
+        """
+        Return the texture of an image of the pass, which is decoded only the
+        first time it is requested
+        """
+        if not image:
+            return None
+
+        return TextureCache.default()\
+            .get_or_create((self._pass, name), image.as_texture)
+
     @classmethod
     def new(clss, a_pass, pass_widget):
-        if a_pass.format() == 'pkpass':
-            return PkPassPlotter.new(a_pass, pass_widget)
-        return EsPassPlotter(a_pass, pass_widget)
+        plotter_constructor = PassFormatRegistry.plotter(a_pass.format())
+        return plotter_constructor(a_pass, pass_widget)
 
     def plot(self, snapshot):
         raise NotImplementedError()
@@ -229,10 +292,7 @@ class EsPassPlotter(PassPlotter):
         self._label_color = self._fg_color.copy()
 
         # Logo
-        self._logo_texture  = None
-
-        if espass.icon():
-            self._logo_texture  = espass.icon().as_texture()
+        self._logo_texture = self._texture('icon', espass.icon())
 
         # Fields
         self._fields = espass.front_fields()
@@ -303,18 +363,9 @@ class PkPassPlotter(PassPlotter):
             if label_color else Color.named('black').as_gdk_rgba()
 
         # Images
-        self._background_texture = None
-        self._logo_texture = None
-        self._strip_texture = None
-
-        if pkpass.background():
-            self._background_texture = pkpass.background().as_texture()
-
-        if pkpass.logo():
-            self._logo_texture = pkpass.logo().as_texture()
-
-        if pkpass.strip():
-            self._strip_texture = pkpass.strip().as_texture()
+        self._background_texture = self._texture('background', pkpass.background())
+        self._logo_texture = self._texture('logo', pkpass.logo())
+        self._strip_texture = self._texture('strip', pkpass.strip())
 
         # Fields
         self._header_fields = pkpass.header_fields()
@@ -367,10 +418,10 @@ class PkPassPlotter(PassPlotter):
         self._snapshot.translate(point)
 
         for field in self._header_fields:
-            field_layout = FieldLayout(self._pango_context, field,
-                                       alignment = Pango.Alignment.RIGHT)
+            field_layout = self._field_layout(field,
+                                              alignment = Pango.Alignment.RIGHT)
 
-            field_original_width = field_layout.get_width()
+            field_original_width = field_layout.get_natural_width()
             field_layout.set_width(right_margin)
 
             field_layout.append(self._snapshot,
@@ -435,9 +486,8 @@ class PkPassWithStripPlotter(PkPassPlotter):
         field_layout_height = 0
 
         if self._primary_fields:
-            field_layout = FieldLayout(self._pango_context,
-                                       self._primary_fields[0],
-                                       value_font = self.PRIMARY_FIELD_VALUE_FONT)
+            field_layout = self._field_layout(self._primary_fields[0],
+                                              value_font = self.PRIMARY_FIELD_VALUE_FONT)
 
             field_layout_height = field_layout.get_height()
             self._snapshot.save()
@@ -466,16 +516,14 @@ class BoardingPassPlotter(PkPassPlotter):
     def _plot_primary_fields(self):
 
         # Origin
-        origin_field = FieldLayout(self._pango_context,
-                                   self._primary_fields[0],
-                                   value_font = PassFont.biggest_value,
-                                   alignment = Pango.Alignment.LEFT)
+        origin_field = self._field_layout(self._primary_fields[0],
+                                          value_font = PassFont.biggest_value,
+                                          alignment = Pango.Alignment.LEFT)
 
         # Destination
-        destination_field = FieldLayout(self._pango_context,
-                                        self._primary_fields[1],
-                                        value_font = PassFont.biggest_value,
-                                        alignment = Pango.Alignment.RIGHT)
+        destination_field = self._field_layout(self._primary_fields[1],
+                                               value_font = PassFont.biggest_value,
+                                               alignment = Pango.Alignment.RIGHT)
 
         destination_field.set_width(PASS_WIDTH - 2 * PASS_MARGIN)
         self._snapshot.save()
@@ -523,19 +571,55 @@ class EventTicketPlotter(PkPassWithStripPlotter):
     def _plot_background(self):
 
         if not self._strip_texture and self._background_texture:
-            rectangle = Graphene.Rect()
-            rectangle.init(-BACKGROUND_BLUR_RADIUS,
-                           -BACKGROUND_BLUR_RADIUS,
-                           PASS_WIDTH + 2 * BACKGROUND_BLUR_RADIUS,
-                           PASS_HEIGHT + 2 * BACKGROUND_BLUR_RADIUS)
+            scale_factor = self._pass_widget.get_scale_factor()
 
-            self._snapshot.push_blur(BACKGROUND_BLUR_RADIUS)
-            self._snapshot.append_texture(self._background_texture, rectangle)
-            self._snapshot.pop()
+            # Blurring is expensive, especially without a GPU, so the blurred
+            # background is rendered once per pass and scale factor
+            blurred_texture = TextureCache.default()\
+                .get_or_create((self._pass, 'blurred-background', scale_factor),
+                               lambda: self.__render_blurred_background(scale_factor))
+
+            if blurred_texture:
+                rectangle = Graphene.Rect()
+                rectangle.init(0, 0, PASS_WIDTH, PASS_HEIGHT)
+                self._snapshot.append_texture(blurred_texture, rectangle)
+            else:
+                self.__append_blurred_background(self._snapshot)
 
         else:
             super()._plot_background()
 
+    def __append_blurred_background(self, snapshot):
+        rectangle = Graphene.Rect()
+        rectangle.init(-BACKGROUND_BLUR_RADIUS,
+                       -BACKGROUND_BLUR_RADIUS,
+                       PASS_WIDTH + 2 * BACKGROUND_BLUR_RADIUS,
+                       PASS_HEIGHT + 2 * BACKGROUND_BLUR_RADIUS)
+
+        snapshot.push_blur(BACKGROUND_BLUR_RADIUS)
+        snapshot.append_texture(self._background_texture, rectangle)
+        snapshot.pop()
+
+    def __render_blurred_background(self, scale_factor):
+        """
+        Render the blurred background into a texture of the size of the pass.
+        Return None if the widget has no renderer yet.
+        """
+        native = self._pass_widget.get_native()
+        renderer = native.get_renderer() if native else None
+
+        if renderer is None:
+            return None
+
+        snapshot = Gtk.Snapshot()
+        snapshot.scale(scale_factor, scale_factor)
+        self.__append_blurred_background(snapshot)
+
+        viewport = Graphene.Rect()
+        viewport.init(0, 0, PASS_WIDTH * scale_factor, PASS_HEIGHT * scale_factor)
+
+        return renderer.render_texture(snapshot.to_node(), viewport)
+
     def _plot_secondary_and_axiliary_fields(self):
         self._plot_fields_layouts(self._secondary_fields + \
                                   self._auxiliary_fields)
@@ -551,9 +635,8 @@ class GenericPlotter(PkPassPlotter):
         if not self._primary_fields:
             return
 
-        field_layout = FieldLayout(self._pango_context,
-                                   self._primary_fields[0],
-                                   value_font = PassFont.big_value)
+        field_layout = self._field_layout(self._primary_fields[0],
+                                          value_font = PassFont.big_value)
         self._snapshot.save()
 
         point = Graphene.Point()
@@ -575,15 +658,26 @@ class GenericPlotter(PkPassPlotter):
         self._plot_fields_layouts(self._secondary_fields)
 
 
+PassFormatRegistry.register_plotter('espass', EsPassPlotter)
+PassFormatRegistry.register_plotter('pkpass', PkPassPlotter.new)
+
+
 class PassWidget(Gtk.Fixed):
 
     __gtype_name__ = 'PassWidget'
 
+    # Amount of plotted passes that are kept in memory as render nodes
+    RENDER_NODE_CACHE_SIZE = 16
+
     def __init__(self):
         super().__init__()
 
+        self.__pass = None
         self.__pass_plotter = None
+        self.__pass_plotter_font_name = None
+        self.__render_nodes = LRUCache(self.RENDER_NODE_CACHE_SIZE)
         self.__barcode_button = None
+        self.__barcode_widget = None
         self.__children = []
 
         self.props.width_request = PASS_WIDTH
@@ -598,47 +692,39 @@ class PassWidget(Gtk.Fixed):
 
         self.add_css_class('card')
 
-    def __on_barcode_clicked(self, args):
-        self.emit('barcode_clicked')
-
-    @GObject.Signal
-    def barcode_clicked(self):
-        pass
-
-    def do_snapshot(self, snapshot):
-        if not self.__pass_plotter:
-            return
-
-        self.__pass_plotter.plot(snapshot)
-
-        if self.__barcode_button:
-            self.snapshot_child(self.__barcode_button, snapshot)
-
-    def content(self, a_pass):
-        if self.__barcode_button:
-            self.remove(self.__barcode_button)
-            self.__barcode_button = None
+        # The appearance of a pass depends on these settings, so changing any
+        # of them requires plotting the pass again
+        style_manager = Adw.StyleManager.get_default()
+        style_manager.connect('notify::dark', self.__on_appearance_changed)
+        style_manager.connect('notify::high-contrast',
+                              self.__on_appearance_changed)
 
-        self.__pass_plotter = PassPlotter.new(a_pass, self)
-        self.create_barcode_button(a_pass)
+        self.get_settings().connect('notify::gtk-font-name',
+                                    self.__on_appearance_changed)
+        self.connect('notify::scale-factor', self.__on_appearance_changed)
 
-        # After changing the plotter, we have to redraw the widget
+    def __on_appearance_changed(self, *args):
         self.queue_draw()
 
-    def create_barcode_button(self, a_pass):
-        barcode = a_pass.barcodes()[0]
+    def __on_barcode_clicked(self, args):
+        self.emit('barcode_clicked')
 
-        if not barcode:
+    def __on_barcode_encoded(self, barcode_widget, success):
+        if barcode_widget is not self.__barcode_widget:
             return
 
-        self.__barcode_button = Gtk.Button()
-        self.__barcode_button.connect('clicked', self.__on_barcode_clicked)
-        self.__barcode_button.add_css_class('barcode-button')
-        barcode_widget = BarcodeWidget()
-        barcode_widget.encode(barcode.format(),
-                              barcode.message(),
-                              barcode.message_encoding())
+        if not success:
+            self.__remove_barcode_button()
+            return
 
+        self.__place_barcode_button(*self.barcode_size(barcode_widget))
+
+    @staticmethod
+    def barcode_size(barcode_widget):
+        """
+        Return the size of the area that displays a barcode. It takes either a
+        BarcodeWidget or a BarcodePlotter.
+        """
         aspect_ratio = barcode_widget.aspect_ratio()
 
         # Square codes
@@ -663,10 +749,157 @@ class PassWidget(Gtk.Fixed):
             barcode_button_width = 177
             barcode_button_height = 177
 
+        return barcode_button_width, barcode_button_height
+
+    def __place_barcode_button(self, barcode_button_width, barcode_button_height):
         self.__barcode_button.props.width_request = barcode_button_width
         self.__barcode_button.props.height_request = barcode_button_height
 
-        self.__barcode_button.set_child(barcode_widget)
-        self.put(self.__barcode_button,
-                 PASS_WIDTH/2 - barcode_button_width/2,
-                 PASS_HEIGHT - PASS_MARGIN - barcode_button_height)
+        x, y = self.barcode_position(barcode_button_width, barcode_button_height)
+
+        if self.__barcode_button.get_parent() is self:
+            self.move(self.__barcode_button, x, y)
+        else:
+            self.put(self.__barcode_button, x, y)
+
+    def __remove_barcode_button(self):
+        if self.__barcode_widget:
+            self.__barcode_widget.cancel_encoding()
+            self.__barcode_widget = None
+
+        if self.__barcode_button:
+            self.remove(self.__barcode_button)
+            self.__barcode_button = None
+
+    @staticmethod
+    def barcode_position(barcode_width, barcode_height):
+        """
+        Return the position of the area that displays a barcode of the given
+        size: centered at the bottom of the pass
+        """
+        return (PASS_WIDTH/2 - barcode_width/2,
+                PASS_HEIGHT - PASS_MARGIN - barcode_height)
+
+    @staticmethod
+    def __placeholder_size(format):
+        """
+        Return the size of the room reserved for a barcode while it is being
+        encoded, based on the aspect ratio expected for its format
+        """
+        aspect_ratio = BarcodeWidget.predicted_aspect_ratio(format)
+
+        if aspect_ratio == 1:
+            return 140, 140
+
+        width = min(PASS_WIDTH - 2*PASS_MARGIN, 140 * aspect_ratio)
+        return width, width // aspect_ratio
+
+    @GObject.Signal
+    def barcode_clicked(self):
+        pass
+
+    def __plotter(self, a_pass, font_name):
+        """
+        Return the plotter of a pass. Plotters keep the text of the pass shaped,
+        so the plotter of the current pass is reused for as long as the font
+        stays the same.
+        """
+        if a_pass is not self.__pass:
+            return PassPlotter.new(a_pass, self)
+
+        if self.__pass_plotter is None or \
+           self.__pass_plotter_font_name != font_name:
+            self.__pass_plotter = PassPlotter.new(self.__pass, self)
+            self.__pass_plotter_font_name = font_name
+
+        return self.__pass_plotter
+
+    def __render_node(self, a_pass):
+        """
+        Return the render node of a pass, plotting it only if it has not been
+        plotted with the current appearance before
+        """
+        style_manager = Adw.StyleManager.get_default()
+        font_name = self.get_settings().props.gtk_font_name
+
+        key = (a_pass,
+               self.get_scale_factor(),
+               style_manager.get_dark(),
+               style_manager.get_high_contrast(),
+               font_name)
+
+        def plot():
+            pass_snapshot = Gtk.Snapshot()
+            self.__plotter(a_pass, font_name).plot(pass_snapshot)
+            return pass_snapshot.to_node()
+
+        return self.__render_nodes.get_or_create(key, plot)
+
+    def do_snapshot(self, snapshot):
+        if not self.__pass:
+            return
+
+        # Passes do not change once they are plotted, so the nodes recorded
+        # the first time are replayed instead of running the plotter again
+        render_node = self.__render_node(self.__pass)
+
+        if render_node:
+            snapshot.append_node(render_node)
+
+        if self.__barcode_button:
+            self.snapshot_child(self.__barcode_button, snapshot)
+
+    def content(self, a_pass):
+        self.__remove_barcode_button()
+
+        if a_pass is not self.__pass:
+            self.__pass_plotter = None
+
+        self.__pass = a_pass
+        self.create_barcode_button(a_pass)
+
+        # After changing the plotter, we have to redraw the widget
+        self.queue_draw()
+
+    def prefetch(self, a_pass):
+        """
+        Prepare what is needed to display a pass, so that displaying it later
+        does not have to decode, shape or encode anything
+        """
+        self.__render_node(a_pass)
+
+        barcodes = a_pass.barcodes()
+        barcode = barcodes[0] if barcodes else None
+
+        if barcode:
+            BarcodeWidget.prefetch(barcode.format(),
+                                   barcode.message(),
+                                   barcode.message_encoding())
+
+    def create_barcode_button(self, a_pass):
+        barcode = a_pass.barcodes()[0]
+
+        if not barcode:
+            return
+
+        self.__barcode_button = Gtk.Button()
+        self.__barcode_button.connect('clicked', self.__on_barcode_clicked)
+        self.__barcode_button.add_css_class('barcode-button')
+
+        self.__barcode_widget = BarcodeWidget()
+        self.__barcode_widget.connect('encoding_finished',
+                                      self.__on_barcode_encoded)
+        self.__barcode_button.set_child(self.__barcode_widget)
+
+        # Barcodes that are not in the cache are encoded in the background.
+        # Meanwhile, the room they are expected to take is reserved.
+        is_ready = self.__barcode_widget.encode_async(barcode.format(),
+                                                      barcode.message(),
+                                                      barcode.message_encoding())
+
+        if is_ready:
+            size = self.barcode_size(self.__barcode_widget)
+        else:
+            size = self.__placeholder_size(barcode.format())
+
+        self.__place_barcode_button(*size)
@@ -0,0 +1,46 @@
+# texture_cache.py
+#
+# Copyright 2022-2023 Pablo Sánchez Rodríguez
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from .lru_cache import LRUCache
+
+
+class TextureCache(LRUCache):
+    """
+    A least recently used cache of the textures used to plot passes.
+
+    Keys start with the pass the texture belongs to, followed by the name of
+    the image and whatever else the texture depends on (e.g. the scale factor
+    of a pre-rendered texture). Images are therefore decoded, and expensive
+    effects applied, only once per pass.
+    """
+
+    DEFAULT_CAPACITY = 64
+
+    __default = None
+
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        super().__init__(capacity)
+
+    @classmethod
+    def default(cls):
+        """
+        Return the cache shared by all the pass plotters
+        """
+        if cls.__default is None:
+            cls.__default = TextureCache()
+
+        return cls.__default
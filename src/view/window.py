@@ -19,7 +19,10 @@ from gi.repository import Gio, GObject, Gtk, Adw
 
 from .additional_information_pane import AdditionalInformationPane
 from .barcode_dialog import BarcodeDialog
+from .digital_pass_list_store import SortPassesBy
 from .pass_list import PassList
+from .pass_row import PassRow
+from .pass_prefetcher import PassPrefetcher
 from .pass_widget import PassWidget
 
 
@@ -28,11 +31,15 @@ class PassesWindow(Adw.ApplicationWindow):
     __gtype_name__ = 'PassesWindow'
 
     main_leaflet = Gtk.Template.Child()
+    sidebar_page = Gtk.Template.Child()
     inner_leaflet = Gtk.Template.Child()
 
     update_button = Gtk.Template.Child()
     info_button = Gtk.Template.Child()
 
+    search_bar = Gtk.Template.Child()
+    search_entry = Gtk.Template.Child()
+
     pass_list = Gtk.Template.Child()
     pass_widget = Gtk.Template.Child()
     pass_additional_info  = Gtk.Template.Child()
@@ -57,12 +64,34 @@ class PassesWindow(Adw.ApplicationWindow):
                                    ['<Control>question'])
 
         # Bind GtkListBox with GioListStore
+        self.__pass_list_model = pass_list_model
         self.pass_list.bind_model(pass_list_model)
 
+        # Typing anywhere in the window starts a search
+        self.search_bar.connect_entry(self.search_entry)
+        self.search_bar.set_key_capture_widget(self)
+
+        search_action = Gio.SimpleAction.new('search', None)
+        search_action.connect('activate', self._on_search_action)
+        self.add_action(search_action)
+
+        self.get_application()\
+            .set_accels_for_action('win.search', ['<Control>f'])
+
+        # The sort order is kept across sessions
+        self.__settings = Gio.Settings.new('me.sanchezrodriguez.passes')
+        self.add_action(self.__settings.create_action('sort-order'))
+        self.__settings.connect('changed::sort-order',
+                                self._on_sort_order_changed)
+        self._on_sort_order_changed(self.__settings, 'sort-order')
+
+        self.__prefetcher = PassPrefetcher(self.pass_widget)
+
         # Connect callbacks
         self.pass_list.connect('row-activated', self._on_row_activated)
         self.pass_widget.connect('barcode-clicked', self._on_barcode_clicked)
         self.info_button.connect('clicked', self._on_info_button_clicked)
+        self.search_entry.connect('search-changed', self._on_search_changed)
 
         self.main_leaflet_can_navigate = True
 
@@ -84,7 +113,33 @@ class PassesWindow(Adw.ApplicationWindow):
     def _on_info_button_clicked(self, button):
         self.inner_leaflet.set_show_content(True);
 
+    def _on_search_action(self, action, parameter):
+        self.search_bar.set_search_mode(True)
+        self.search_entry.grab_focus()
+
+    def _on_search_changed(self, search_entry):
+        query = search_entry.get_text()
+
+        self.pass_list.set_searching(bool(query.strip()))
+        self.__pass_list_model.search(query)
+
+    def _on_sort_order_changed(self, settings, key):
+        sort_order = settings.get_string(key)
+        selected_pass = self.selected_pass()
+
+        self.__pass_list_model.set_sort_order(sort_order)
+        self.pass_list.set_date_headers(sort_order == SortPassesBy.EXPIRATION_DATE)
+
+        # Rows are created again when passes are sorted, so the selection
+        # has to be restored
+        if selected_pass:
+            self.pass_list.select_pass(selected_pass)
+
     def _on_row_activated(self, pass_list, pass_row):
+        # Group rows just show or hide their passes
+        if not isinstance(pass_row, PassRow):
+            return
+
         a_pass = pass_row.data()
 
         self.update_button.set_sensitive(a_pass.is_updatable())
@@ -92,6 +147,14 @@ class PassesWindow(Adw.ApplicationWindow):
         self.pass_widget.content(a_pass)
         self.pass_additional_info.content(a_pass)
 
+        # Keyboard navigation usually moves to one of the neighbors of the
+        # selected pass, so they are prepared in advance
+        index = pass_row.get_index()
+        neighbors = [self.pass_list.get_row_at_index(index + 1),
+                     self.pass_list.get_row_at_index(index - 1) if index > 0 else None]
+
+        self.__prefetcher.prefetch([row.data() for row in neighbors if row])
+
         if self.main_leaflet_can_navigate:
             self.main_leaflet.set_show_content(True)
 
@@ -104,14 +167,65 @@ class PassesWindow(Adw.ApplicationWindow):
     def navigate_back(self):
         self.main_leaflet.set_show_content(False)
 
+    def present_passes(self, pass_list_model, archived=False):
+        """
+        Present another list of passes, e.g. the archived ones
+        """
+        self.__pass_list_model = pass_list_model
+
+        self.sidebar_page.set_title(_('Archive') if archived else _('Passes'))
+        self.pass_list.set_archived(archived)
+        self.pass_list.bind_model(pass_list_model)
+
+        # Both lists are sorted and searched the same way
+        pass_list_model.set_sort_order(self.__settings.get_string('sort-order'))
+        pass_list_model.search(self.search_entry.get_text())
+
+        if pass_list_model.is_empty():
+            self.force_fold(True)
+            self.navigate_back()
+            return
+
+        self.force_fold(False)
+        self.select_pass_at_index(0)
+
+    def search(self, query):
+        """
+        Present the passes that match a query. An empty query closes the
+        search bar.
+        """
+        self.search_entry.set_text(query)
+        self.search_bar.set_search_mode(bool(query))
+
+        # The search-changed signal is emitted after a delay, which would
+        # select the wrong pass if one is selected right after searching
+        self._on_search_changed(self.search_entry)
+
     def select_pass_at_index(self, index):
-        self.pass_list.select_pass_at_index(index)
+        """
+        Select a pass by its position among the presented passes, or the
+        first pass if there is none at that position
+        """
+        passes = self.__pass_list_model.get_model()
+
+        if index is None or not 0 <= index < passes.get_n_items():
+            index = 0
+
+        a_pass = passes.get_item(index)
+        if a_pass:
+            self.pass_list.select_pass(a_pass)
 
     def selected_pass(self):
         return self.pass_list.selected_pass()
 
     def selected_pass_index(self):
-        return self.pass_list.selected_pass_index()
+        selected_pass = self.selected_pass()
+
+        if not selected_pass:
+            return None
+
+        found, index = self.__pass_list_model.find(selected_pass)
+        return index if found else None
 
     def show_toast(self, message):
         toast = Adw.Toast.new(message)
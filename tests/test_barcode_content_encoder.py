@@ -0,0 +1,77 @@
+# test_barcode_content_encoder.py
+#
+# Copyright 2022-2023 Pablo Sánchez Rodríguez
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import builtins
+import os
+import sys
+import unittest
+
+sys.path.insert(1, os.environ.get('PASSES_PKGDATADIR', '/app/share/passes'))
+builtins._ = lambda message: message
+
+from passes.barcode_content_encoder import BarcodeContentEncoder, BarcodeType
+
+
+class BarcodeContentEncoderTest(unittest.TestCase):
+
+    def test_batch_matches_single_encoding(self):
+        # Payloads of different lengths make zint pick different sizes and
+        # options for consecutive barcodes of the same symbology
+        texts = ['%0*d' % (length, length) for length in [1, 300, 2, 120, 10, 40]]
+
+        for barcode_type in BarcodeType:
+            with self.subTest(barcode_type=barcode_type.name):
+                barcodes = [(text, barcode_type, None) for text in texts]
+                module_list, layout = BarcodeContentEncoder.encode_barcodes(barcodes)
+
+                for text, barcode_layout in zip(texts, layout):
+                    modules, width, height = \
+                        BarcodeContentEncoder.encode_barcode(text, barcode_type, None)
+
+                    self.assertEqual(barcode_layout[1:], (width, height))
+
+                    offset = barcode_layout[0]
+                    self.assertEqual(module_list[offset:offset + width * height], modules)
+
+    def test_batch_mixes_symbologies(self):
+        barcodes = [('%0*d' % (length, length), barcode_type, None)
+                    for length in [3, 90, 7]
+                    for barcode_type in BarcodeType]
+
+        module_list, layout = BarcodeContentEncoder.encode_barcodes(barcodes)
+
+        for (text, barcode_type, encoding), (offset, width, height) in zip(barcodes, layout):
+            modules, expected_width, expected_height = \
+                BarcodeContentEncoder.encode_barcode(text, barcode_type, encoding)
+
+            self.assertEqual((width, height), (expected_width, expected_height))
+            self.assertEqual(module_list[offset:offset + width * height], modules)
+
+    def test_batch_skips_barcodes_that_cannot_be_encoded(self):
+        barcodes = [('0123', BarcodeType.QRCODE, None),
+                    ('€', BarcodeType.QRCODE, 'ascii'),
+                    ('4567', BarcodeType.QRCODE, None)]
+
+        module_list, layout = BarcodeContentEncoder.encode_barcodes(barcodes)
+
+        self.assertIsNotNone(layout[0])
+        self.assertIsNone(layout[1])
+        self.assertIsNotNone(layout[2])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+# test_pass_catalog.py
+#
+# Copyright 2022-2023 Pablo Sánchez Rodríguez
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import builtins
+import os
+import sys
+import unittest
+
+sys.path.insert(1, os.environ.get('PASSES_PKGDATADIR', '/app/share/passes'))
+builtins._ = lambda message: message
+
+from passes.pass_catalog import PassCatalog
+
+
+def catalog_entry(path, terms, barcodes):
+    return {'path': path,
+            'stamp': [1, 2],
+            'description': 'Description',
+            'creator': 'Creator',
+            'icon': None,
+            'terms': terms,
+            'barcodes': barcodes}
+
+
+class PassCatalogTest(unittest.TestCase):
+
+    def test_corrupt_entries_are_dropped(self):
+        valid_entry = catalog_entry('/passes/ab/valid.pkpass',
+                                    ['boarding', 'pass'],
+                                    [['QR_CODE', 'M1DOE']])
+
+        entries = {'valid': valid_entry,
+                   'not-a-dict': ['terms'],
+                   'no-stamp-or-path': {'terms': ['a']},
+                   'bad-stamp': dict(valid_entry, stamp='yesterday'),
+                   'short-stamp': dict(valid_entry, stamp=[1]),
+                   'bad-path': dict(valid_entry, path=42),
+                   'bad-description': dict(valid_entry, description=['a']),
+                   'bad-terms': dict(valid_entry, terms='boarding pass'),
+                   'bad-term': dict(valid_entry, terms=['boarding', None]),
+                   'bad-barcodes': dict(valid_entry, barcodes='QR_CODE'),
+                   'short-barcode': dict(valid_entry, barcodes=[['QR_CODE']]),
+                   'bad-barcode': dict(valid_entry, barcodes=[['QR_CODE', 7]]),
+                   'string-barcode': dict(valid_entry, barcodes=['QR']),
+                   'no-barcodes': {key: value for key, value in valid_entry.items()
+                                   if key != 'barcodes'}}
+
+        catalog = PassCatalog()
+        catalog.load_entries(entries)
+
+        self.assertEqual(set(catalog.entries()), {'valid', 'no-stamp-or-path', 'no-barcodes'})
+        self.assertEqual(catalog.identifiers_in('/passes'), {'valid', 'no-barcodes'})
+        self.assertEqual(catalog.search('boarding'), {'valid', 'no-barcodes'})
+        self.assertEqual(catalog.find_barcode('M1DOE'), 'valid')
+
+
+if __name__ == '__main__':
+    unittest.main()
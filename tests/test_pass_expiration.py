@@ -0,0 +1,98 @@
+# test_pass_expiration.py
+#
+# Copyright 2022-2023 Pablo Sánchez Rodríguez
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import builtins
+import gettext
+import json
+import os
+import sys
+import tempfile
+import unittest
+import zipfile
+
+# The application keeps its passes in the user data directory, which GLib
+# reads only once
+data_home = tempfile.TemporaryDirectory()
+os.environ['XDG_DATA_HOME'] = data_home.name
+
+pkgdatadir = os.environ.get('PASSES_PKGDATADIR', '/app/share/passes')
+sys.path.insert(1, pkgdatadir)
+builtins._ = lambda message: message
+builtins.ngettext = gettext.ngettext
+
+from gi.repository import Gio
+
+Gio.Resource.load(os.path.join(pkgdatadir, 'passes.gresource'))._register()
+
+from passes.main import Application
+
+
+def write_pass(path, voided=False):
+    pass_data = {'formatVersion': 1,
+                 'passTypeIdentifier': 'pass.org.example',
+                 'serialNumber': '0001',
+                 'teamIdentifier': 'EXAMPLE',
+                 'organizationName': 'Example',
+                 'description': 'Example pass',
+                 'barcode': {'format': 'PKBarcodeFormatQR',
+                             'message': '0001',
+                             'messageEncoding': 'iso-8859-1'},
+                 'generic': {}}
+
+    if voided:
+        pass_data['voided'] = True
+
+    with zipfile.ZipFile(path, 'w') as pass_file:
+        pass_file.writestr('pass.json', json.dumps(pass_data))
+        pass_file.writestr('manifest.json', json.dumps({'pass.json': ''}))
+
+
+class PassExpirationTest(unittest.TestCase):
+
+    def test_pass_that_expires_at_runtime_is_archived(self):
+        application = Application()
+        persistence = application._Application__persistence
+        catalog = application._Application__catalog
+        pass_list = application._Application__pass_list
+
+        # Pass files that are not in their shard are moved into it
+        os.makedirs(persistence.passes_directory(), exist_ok=True)
+        write_pass(os.path.join(persistence.passes_directory(),
+                                'pass.org.example.0001.pkpass'))
+
+        application._Application__prepare_pass_files()
+        application._Application__load_passes()
+
+        self.assertEqual(len(pass_list.identifiers()), 1)
+        identifier = next(iter(pass_list.identifiers()))
+        path = catalog.entry(identifier)['path']
+
+        # Another program, e.g. a sync tool, voids the pass
+        write_pass(path, voided=True)
+        application._Application__on_pass_files_changed([path], [])
+
+        self.assertFalse(pass_list.identifiers())
+        self.assertFalse(os.path.exists(path))
+
+        archived_path = catalog.entry(identifier)['path']
+        self.assertTrue(os.path.exists(archived_path))
+        self.assertEqual(application._Application__archived_identifiers(),
+                         {identifier})
+
+
+if __name__ == '__main__':
+    unittest.main()